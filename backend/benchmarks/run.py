@@ -0,0 +1,240 @@
+"""
+Benchmark the data tools and the /chat pipeline on synthetic data.
+
+Run from backend/:
+
+    python -m benchmarks.run --rows 10000 100000 1000000
+    python -m benchmarks.run --rows 10000 --compare benchmarks/results/<old commit>.json
+
+Datasets are bootstrapped from static/student-mat.csv (built once, kept in
+benchmarks/data); /chat is driven against a local stub OpenAI-compatible
+server. Results go to benchmarks/results/<commit>.json.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import synthetic
+from benchmarks.stub_llm import StubLLMServer, SCRIPTS
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+DEFAULT_PDF_PAGES = [50, 500]
+SUITES = ("tools", "knowledge_base", "chat")
+
+# Charts exercised directly and through a dashboard; columns exist in student-mat.csv
+CHART_SPECS = [
+    {"chart_type": "bar", "x_column": "school", "aggregation": "count", "title": "Students by School"},
+    {"chart_type": "bar", "x_column": "Mjob", "y_column": "G3", "aggregation": "mean", "title": "G3 by Mother's Job"},
+    {"chart_type": "line", "x_column": "absences", "y_column": "G3", "aggregation": "mean", "title": "G3 by Absences"},
+    {"chart_type": "scatter", "x_column": "G1", "y_column": "G3", "title": "G1 vs G3"}
+]
+KB_QUERIES = ["absences and final grade", "family support", "alcohol consumption of rural students"]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure(func, repeat, setup=None):
+    """
+    Run func() `repeat` times; returns (timings in ms, last result). setup()
+    runs untimed before each run, so cached results can be dropped and every
+    run does the full work.
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+
+def cached_ms(func):
+    """One run of func() right after a measured one, served from the result caches."""
+    start = time.perf_counter()
+    func()
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+def _entry(name, timings, **params):
+    return dict(
+        benchmark=name,
+        **params,
+        runs=len(timings),
+        first_ms=round(timings[0], 3),
+        min_ms=round(min(timings), 3),
+        median_ms=round(statistics.median(timings), 3),
+        mean_ms=round(statistics.fmean(timings), 3),
+        times_ms=[round(t, 3) for t in timings]
+    )
+
+
+def _report(entry):
+    params = " ".join(f"{k}={v}" for k, v in entry.items() if k not in ("benchmark", "runs", "times_ms") and not k.endswith("_ms"))
+    cached = f"  cached {entry['cached_ms']:>8.2f} ms" if "cached_ms" in entry else ""
+    print(f"[BENCH] {entry['benchmark']:<24} {params:<40} median {entry['median_ms']:>10.2f} ms  first {entry['first_ms']:>10.2f} ms{cached}")
+
+
+def bench_tools(tools, path, rows, repeat):
+    results = []
+    timings, _ = measure(lambda: tools.load_data(path), repeat)
+    results.append(_entry("load_data", timings, rows=rows))
+    filename = os.path.basename(path)
+
+    def cold():
+        # Chart results, aggregates, profiles and samples would otherwise answer every run after the first
+        tools._invalidate_derived(filename)
+
+    def bench(name, func, **params):
+        timings, _ = measure(func, repeat, setup=cold)
+        results.append(dict(_entry(name, timings, rows=rows, **params), cached_ms=cached_ms(func)))
+
+    for spec in CHART_SPECS:
+        bench("generate_chart_data", lambda: tools.generate_chart_data(filename=filename, **spec), chart=spec["title"])
+    bench("generate_dashboard", lambda: tools.generate_dashboard(CHART_SPECS), charts=len(CHART_SPECS))
+    for spec in CHART_SPECS[:2]:
+        bench("create_visualization", lambda: tools.create_visualization(filename=filename, **spec), chart=spec["title"])
+    for layout in ("grid", "separate"):
+        specs = [dict(spec, filename=filename) for spec in CHART_SPECS]
+        bench("create_dashboard_image", lambda: tools.create_dashboard_image(specs, layout=layout), charts=len(specs), layout=layout)
+    return results
+
+
+def bench_knowledge_base(tools, path, pages, repeat):
+    results = []
+    # The first load parses the PDF, later ones are served from the chunk store
+    timings, _ = measure(lambda: tools.load_data(path), repeat)
+    results.append(_entry("load_pdf", timings, pages=pages))
+    for mode in ("keyword", "vector", "hybrid"):
+        for query in KB_QUERIES:
+            timings, _ = measure(lambda: tools.query_knowledge_base(query, mode=mode), repeat)
+            results.append(_entry("query_knowledge_base", timings, pages=pages, mode=mode, query=query))
+    return results
+
+
+def bench_chat(client, tools, rows, repeat):
+    results = []
+    for prompt in SCRIPTS:
+        def setup():
+            # Fresh history each time, so the prompt does not grow across runs,
+            # and no cached tool results, so every run computes its charts
+            client.delete("/history/bench")
+            tools._invalidate_derived(tools.active_file)
+
+        def chat():
+            response = client.post("/chat", json={"message": prompt, "role": "bench", "data_format": "columnar"})
+            response.raise_for_status()
+            return response
+        timings, response = measure(chat, repeat, setup=setup)
+        results.append(_entry("chat", timings, rows=rows, prompt=prompt, response_bytes=len(response.content)))
+    return results
+
+
+def compare(results, baseline_path):
+    """Print median ratios against a previous results file (above 1.0 is slower). Medians are of uncached runs."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def key(entry):
+        return tuple((k, v) for k, v in entry.items() if k not in ("runs", "times_ms", "response_bytes") and not k.endswith("_ms"))
+
+    previous = {key(entry): entry for entry in baseline["results"]}
+    print(f"[BENCH] Compared with {baseline.get('commit')} ({baseline_path}):")
+    for entry in results:
+        old = previous.get(key(entry))
+        if old and old["median_ms"]:
+            ratio = entry["median_ms"] / old["median_ms"]
+            flag = "  REGRESSION" if ratio > 1.2 else ""
+            print(f"[BENCH]   {entry['benchmark']:<24} {old['median_ms']:>10.2f} -> {entry['median_ms']:>10.2f} ms  x{ratio:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="dataset sizes, up to 10000000")
+    parser.add_argument("--pdf-pages", type=int, nargs="+", default=DEFAULT_PDF_PAGES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=list(SUITES))
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds the stub LLM waits before answering")
+    parser.add_argument("--data-dir", default=os.path.join(BENCH_DIR, "data"))
+    parser.add_argument("--output", help="results file, default benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data_dir)
+    output = os.path.abspath(args.output or os.path.join(BENCH_DIR, "results", f"{_git_commit()}.json"))
+
+    # Charts, the chunk store and the chat database go to a scratch directory, wiped every run
+    work_dir = os.path.join(BENCH_DIR, "work")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    os.chdir(work_dir)
+
+    stub = StubLLMServer(latency=args.llm_latency).start()
+    os.environ["NVIDIA_API_KEY"] = "benchmark"
+    os.environ["LLM_BASE_URL"] = stub.base_url
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'bench.db')}"
+    # The gateway's rate limit would otherwise dominate the chat timings
+    os.environ.setdefault("LLM_RATE_PER_SECOND", "1000")
+    os.environ.setdefault("LLM_BURST", "1000")
+
+    import tools
+    results = []
+    if "knowledge_base" in args.suites:
+        for pages in args.pdf_pages:
+            for entry in bench_knowledge_base(tools, synthetic.synthetic_pdf(pages, data_dir), pages, args.repeat):
+                _report(entry)
+                results.append(entry)
+
+    client = None
+    if "chat" in args.suites:
+        from fastapi.testclient import TestClient
+        import main as app_module
+        client = TestClient(app_module.app)
+
+    for rows in args.rows:
+        path = synthetic.scaled_dataset(rows, data_dir)
+        suite_results = []
+        if "tools" in args.suites:
+            suite_results += bench_tools(tools, path, rows, args.repeat)
+        if client is not None:
+            tools.load_data(path)
+            suite_results += bench_chat(client, tools, rows, args.repeat)
+        for entry in suite_results:
+            _report(entry)
+        results += suite_results
+    stub.stop()
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "data_dir")},
+        "results": results
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"[BENCH] Wrote {len(results)} results to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Scripted tool calls per user message; any other message gets a plain text answer
+SCRIPTS = {
+    "show students by school": [
+        ("generate_chart_data", {"chart_type": "bar", "x_column": "school", "aggregation": "count", "title": "Students by School"})
+    ],
+    "average final grade by study time": [
+        ("generate_chart_data", {"chart_type": "line", "x_column": "studytime", "y_column": "G3", "aggregation": "mean", "title": "G3 by Study Time"})
+    ],
+    "compare students by school, gender and age": [
+        ("generate_dashboard", {"chart_specs": [
+            {"chart_type": "bar", "x_column": "school", "title": "Students by School", "aggregation": "count"},
+            {"chart_type": "pie", "x_column": "sex", "title": "Students by Gender", "aggregation": "count"},
+            {"chart_type": "bar", "x_column": "age", "title": "Students by Age", "aggregation": "count"},
+            {"chart_type": "scatter", "x_column": "G1", "y_column": "G3", "title": "G1 vs G3"}
+        ]})
+    ],
+    "what does the report say about absences": [
+        ("query_knowledge_base", {"query": "absences and final grade"})
+    ]
+}
+
+
+def _completion(model, content=None, tool_calls=None):
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = [
+            {"id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+            for i, (name, args) in enumerate(tool_calls)
+        ]
+    return {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if tool_calls else "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    }
+
+
+class StubLLMServer:
+    """
+    OpenAI-compatible /v1/chat/completions endpoint on localhost that answers
+    from SCRIPTS after a fixed `latency`, so /chat can be timed without the
+    network or a real model. Requests that already carry tool results get ".".
+    """
+
+    def __init__(self, latency=0.0, port=0):
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                server.requests += 1
+                messages = body.get("messages", [])
+                if server.latency:
+                    time.sleep(server.latency)
+                if any(message.get("role") == "tool" for message in messages):
+                    payload = _completion(body.get("model"), content=".")
+                else:
+                    prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+                    script = SCRIPTS.get(prompt.strip().lower())
+                    payload = _completion(body.get("model"), content=None if script else "No chart needed.", tool_calls=script)
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
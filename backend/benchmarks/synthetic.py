@@ -0,0 +1,96 @@
+import os
+import random
+import numpy as np
+import pandas as pd
+
+BASE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "student-mat.csv")
+# Rows generated and written per step, so 10M-row files are built with bounded memory
+WRITE_CHUNK_ROWS = 500_000
+
+_TOPICS = [
+    "study time", "weekly alcohol consumption", "number of absences", "final grade", "past class failures",
+    "family support", "internet access at home", "extra paid classes", "parents' education", "health status"
+]
+_TEMPLATES = [
+    "Students with higher {a} tended to report lower {b} over the school year.",
+    "The survey found no clear link between {a} and {b} once school was accounted for.",
+    "Teachers noted that {a} was the strongest single predictor of {b} in the second period.",
+    "Across both schools, {a} varied more among rural students than {b} did.",
+    "Interventions targeting {a} improved {b} for roughly one in five students."
+]
+
+
+def scaled_dataset(rows, directory, seed=0):
+    """
+    CSV of `rows` students bootstrapped from student-mat.csv, with grades and
+    absences jittered so values are not plain copies. Reused if already built.
+    """
+    path = os.path.join(directory, f"students-{rows}.csv")
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    base = pd.read_csv(BASE_CSV)
+    rng = np.random.default_rng(seed)
+    tmp_path = f"{path}.tmp"
+    for start in range(0, rows, WRITE_CHUNK_ROWS):
+        n = min(WRITE_CHUNK_ROWS, rows - start)
+        chunk = base.iloc[rng.integers(0, len(base), n)].reset_index(drop=True)
+        chunk['absences'] = (chunk['absences'] + rng.integers(-2, 3, n)).clip(lower=0)
+        for column in ('G1', 'G2', 'G3'):
+            chunk[column] = (chunk[column] + rng.integers(-1, 2, n)).clip(0, 20)
+        chunk.to_csv(tmp_path, mode='w' if start == 0 else 'a', header=start == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def synthetic_pdf(pages, directory, seed=0, lines_per_page=45):
+    """
+    Text-only PDF of `pages` pages of generated survey commentary, written by
+    hand (one Helvetica font, one content stream per page) so no PDF library
+    is needed. Reused if already built.
+    """
+    path = os.path.join(directory, f"report-{pages}p.pdf")
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+
+    # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    page_ids = []
+    for page in range(pages):
+        lines = [f"Section {page + 1}"]
+        for _ in range(lines_per_page - 1):
+            a, b = rng.sample(_TOPICS, 2)
+            lines.append(rng.choice(_TEMPLATES).format(a=a, b=b))
+        text = " T* ".join(f"({_pdf_escape(line)}) Tj" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text} ET".encode('latin-1')
+        objects.append(None)
+        page_ids.append(len(objects))
+        objects[-1] = f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects) + 1} 0 R >>".encode()
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(f"{path}.tmp", 'wb') as f:
+        f.write(output)
+    os.replace(f"{path}.tmp", path)
+    return path
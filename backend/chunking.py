@@ -0,0 +1,97 @@
+import os
+import re
+import zlib
+import numpy as np
+
+# Bump when chunk boundaries change so stored chunks from older versions are not reused
+CHUNKER_VERSION = 2
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1000"))
+CHUNK_OVERLAP_CHARS = int(os.getenv("CHUNK_OVERLAP_CHARS", "150"))
+CHUNK_MIN_CHARS = 50
+# Chunks whose estimated word-shingle Jaccard similarity reaches this are dropped
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("CHUNK_NEAR_DUPLICATE_THRESHOLD", "0.9"))
+
+MINHASH_PERMUTATIONS = 32
+MINHASH_BANDS = 8
+SHINGLE_WORDS = 3
+_MERSENNE_61 = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(1)
+_HASH_A = _rng.integers(1, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+_HASH_B = _rng.integers(0, 1 << 32, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# Preferred cut points, best first
+_BREAKS = ('\n\n', '. ', '\n', ' ')
+
+
+def _break_point(text, low, high):
+    for separator in _BREAKS:
+        position = text.rfind(separator, low, high)
+        if position != -1:
+            return position + len(separator)
+    return high
+
+
+def split_text(text, max_chars=CHUNK_MAX_CHARS, overlap=CHUNK_OVERLAP_CHARS, min_chars=CHUNK_MIN_CHARS):
+    """
+    Split `text` into windows of at most `max_chars` characters that overlap by
+    about `overlap` characters. Windows end on a paragraph, sentence or word
+    boundary when one exists in their second half; a short tail is merged into
+    the previous window.
+    """
+    text = re.sub(r'[ \t]+', ' ', text).strip()
+    windows = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            end = _break_point(text, start + max_chars // 2, end)
+        window = text[start:end].strip()
+        if len(window) >= min_chars:
+            windows.append(window)
+        elif windows and window:
+            windows[-1] = f"{windows[-1]} {window}"
+        if end >= len(text):
+            break
+        # Step back by the overlap, then forward to the next word start
+        next_start = max(end - overlap, start + 1)
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return windows
+
+
+def minhash_signatures(texts):
+    """MinHash signatures over word shingles, one row of MINHASH_PERMUTATIONS uint64 per text."""
+    signatures = np.full((len(texts), MINHASH_PERMUTATIONS), np.iinfo(np.uint64).max, dtype=np.uint64)
+    for row, text in enumerate(texts):
+        words = re.findall(r'\w+', text.lower())
+        shingles = {
+            zlib.crc32(' '.join(words[i:i + SHINGLE_WORDS]).encode())
+            for i in range(max(len(words) - SHINGLE_WORDS + 1, 1))
+        }
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        # a * x < 2**64 because both are below 2**32
+        hashed = (_HASH_A[:, None] * values[None, :] + _HASH_B[:, None]) % _MERSENNE_61
+        signatures[row] = hashed.min(axis=1)
+    return signatures
+
+
+def near_duplicates(texts, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """Boolean mask of texts that nearly duplicate an earlier text (MinHash with LSH banding)."""
+    duplicate = np.zeros(len(texts), dtype=bool)
+    if len(texts) < 2:
+        return duplicate
+    signatures = minhash_signatures(texts)
+    rows_per_band = MINHASH_PERMUTATIONS // MINHASH_BANDS
+    buckets = [{} for _ in range(MINHASH_BANDS)]
+
+    for i, signature in enumerate(signatures):
+        candidates = set()
+        keys = [signature[b * rows_per_band:(b + 1) * rows_per_band].tobytes() for b in range(MINHASH_BANDS)]
+        for band, key in enumerate(keys):
+            candidates.update(buckets[band].get(key, ()))
+        if any(np.mean(signatures[j] == signature) >= threshold for j in candidates):
+            duplicate[i] = True
+            continue
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(i)
+    return duplicate
@@ -0,0 +1,241 @@
+import os
+import json
+import threading
+from collections.abc import MutableMapping
+import pandas as pd
+import pyarrow as pa
+
+try:
+    import fcntl
+except ImportError:  # Windows: catalog writes are still atomic, just not serialized
+    fcntl = None
+
+STORE_DIR = os.getenv("DATASET_STORE_DIR", os.path.join("static", ".datastore"))
+CATALOG_FILE = "catalog.json"
+LOCK_FILE = "catalog.lock"
+
+
+def _string_types(arrow_type):
+    # Keep string columns as Arrow-backed strings so they stay on the mapped pages
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.StringDtype("pyarrow")
+    return None
+
+
+def _to_arrow(df):
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns cannot be typed by Arrow, store them as text; missing values stay null
+        df = df.copy()
+        for column in df.columns:
+            if df[column].dtype == object:
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_arrow(df, path):
+    """Write `df` as an uncompressed Arrow IPC file so readers can memory-map it."""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    table = _to_arrow(df)
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_arrow(path):
+    """Memory-map an Arrow IPC file into a DataFrame without copying column buffers where possible."""
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=_string_types)
+
+
+class SharedDatasetStore(MutableMapping):
+    """
+    Dataset store shared by every worker process on the host.
+
+    Each dataset is an Arrow IPC file under `directory`, memory-mapped by every
+    reader so workers share the same physical pages. A small JSON catalog maps
+    filenames to their current file and version, and records the active file
+    and uploaded documents. Readers notice changes by the catalog's mtime.
+    """
+
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._catalog_path = os.path.join(directory, CATALOG_FILE)
+        self._lock_path = os.path.join(directory, LOCK_FILE)
+        self._catalog = {"datasets": {}, "documents": {}, "active_file": None}
+        self._catalog_mtime = None
+        # Key: filename, Value: (version, memory-mapped DataFrame)
+        self._frames = {}
+        # Datasets changed since the last take_changes(), whichever method noticed the change
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    # Catalog
+
+    def _read_catalog(self):
+        try:
+            with open(self._catalog_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"datasets": {}, "documents": {}, "active_file": None}
+
+    def _update_catalog(self, update):
+        """Read-modify-write the catalog under an exclusive file lock."""
+        with open(self._lock_path, 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                catalog = self._read_catalog()
+                update(catalog)
+                tmp_path = f"{self._catalog_path}.tmp{os.getpid()}"
+                with open(tmp_path, 'w') as f:
+                    json.dump(catalog, f)
+                os.replace(tmp_path, self._catalog_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        self.refresh()
+
+    def refresh(self):
+        """Reload the catalog if another process changed it. Returns the names of changed datasets."""
+        try:
+            stat = os.stat(self._catalog_path)
+        except FileNotFoundError:
+            return set()
+        # The catalog is replaced atomically, so a new inode also means a new catalog
+        mtime = (stat.st_mtime_ns, stat.st_ino)
+        if mtime == self._catalog_mtime:
+            return set()
+
+        with self._lock:
+            previous = self._catalog["datasets"]
+            self._catalog = self._read_catalog()
+            self._catalog_mtime = mtime
+            current = self._catalog["datasets"]
+            changed = {
+                name for name in set(previous) | set(current)
+                if previous.get(name, {}).get("version") != current.get(name, {}).get("version")
+            }
+            for name in changed:
+                self._frames.pop(name, None)
+            self._changed |= changed
+        return changed
+
+    def take_changes(self):
+        """Refresh, then return and forget the names of datasets changed since the last call."""
+        self.refresh()
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        return changed
+
+    def version(self, name):
+        entry = self._catalog["datasets"].get(name)
+        return entry["version"] if entry else None
+
+    def source_path(self, name):
+        """Absolute path of the file `name` was stored from, or None."""
+        self.refresh()
+        entry = self._catalog["datasets"].get(name)
+        return entry.get("source_path") if entry else None
+
+    def is_current(self, name, source_path):
+        """True if `name` is stored from the same, unmodified source file."""
+        self.refresh()
+        entry = self._catalog["datasets"].get(name)
+        if not entry:
+            return False
+        stat = os.stat(source_path)
+        return entry.get("source_mtime") == stat.st_mtime_ns and entry.get("source_size") == stat.st_size
+
+    @property
+    def active_file(self):
+        return self._catalog.get("active_file")
+
+    def set_active(self, name):
+        def update(catalog):
+            catalog["active_file"] = name
+        self._update_catalog(update)
+
+    def documents(self):
+        """{filename: {"path": ..., "version": ...}} of uploaded documents."""
+        self.refresh()
+        return dict(self._catalog.get("documents", {}))
+
+    def add_document(self, name, path):
+        def update(catalog):
+            documents = catalog.setdefault("documents", {})
+            version = documents.get(name, {}).get("version", 0) + 1
+            documents[name] = {"path": os.path.abspath(path), "version": version}
+        self._update_catalog(update)
+
+    # Mapping interface, so the store can stand in for the plain dataframes dict
+
+    def __getitem__(self, name):
+        self.refresh()
+        entry = self._catalog["datasets"][name]
+        with self._lock:
+            cached = self._frames.get(name)
+            if cached and cached[0] == entry["version"]:
+                return cached[1]
+        df = read_arrow(os.path.join(self.directory, entry["file"]))
+        with self._lock:
+            self._frames[name] = (entry["version"], df)
+        return df
+
+    def store(self, name, df, source_path=None):
+        """Publish `df` under `name` to every worker and return the memory-mapped copy."""
+        version = (self.version(name) or 0) + 1
+        data_file = f"{name}.{os.getpid()}.{version}.arrow"
+        write_arrow(df, os.path.join(self.directory, data_file))
+        stale = []
+
+        def update(catalog):
+            entry = catalog["datasets"].get(name)
+            if entry:
+                stale.append(entry["file"])
+            new_entry = {"file": data_file, "version": max(version, (entry or {}).get("version", 0) + 1)}
+            if source_path:
+                stat = os.stat(source_path)
+                new_entry["source_path"] = os.path.abspath(source_path)
+                new_entry["source_mtime"] = stat.st_mtime_ns
+                new_entry["source_size"] = stat.st_size
+            catalog["datasets"][name] = new_entry
+
+        self._update_catalog(update)
+        self._remove_files(stale, keep=data_file)
+        return self[name]
+
+    def _remove_files(self, files, keep=None):
+        # Readers that still map an old file keep it alive until they refresh (POSIX unlink semantics)
+        for old_file in files:
+            if old_file != keep:
+                try:
+                    os.remove(os.path.join(self.directory, old_file))
+                except OSError:
+                    pass
+
+    def __contains__(self, name):
+        self.refresh()
+        return name in self._catalog["datasets"]
+
+    def __setitem__(self, name, df):
+        self.store(name, df)
+
+    def __delitem__(self, name):
+        removed = []
+
+        def update(catalog):
+            removed.append(catalog["datasets"].pop(name)["file"])
+        self._update_catalog(update)
+        self._remove_files(removed)
+
+    def __iter__(self):
+        self.refresh()
+        return iter(list(self._catalog["datasets"]))
+
+    def __len__(self):
+        self.refresh()
+        return len(self._catalog["datasets"])
@@ -0,0 +1,137 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Point budget for line, area and scatter charts
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+# Bar and pie charts show categories, more than this is unreadable anyway
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "100"))
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: pick `n_out` indices of the series (x, y)
+    that preserve its visual shape. `x` must be sorted ascending.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets over the interior points, the final point is its own bucket
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    x_sum = np.concatenate(([0.0], np.cumsum(x)))
+    y_sum = np.concatenate(([0.0], np.cumsum(y)))
+    widths = np.maximum(edges[2:] - edges[1:-1], 1)
+    next_x = (x_sum[edges[2:]] - x_sum[edges[1:-1]]) / widths
+    next_y = (y_sum[edges[2:]] - y_sum[edges[1:-1]]) / widths
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if end <= start:
+            selected[i + 1] = a
+            continue
+        # Twice the triangle area between the previous pick, each candidate and the next bucket mean
+        area = np.abs(
+            (x[a] - next_x[i]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y[i] - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return np.unique(selected)
+
+
+def density_sample_indices(x, y, n_out, seed=0):
+    """
+    Thin a scatter to `n_out` points: keep one point from every occupied cell
+    of a sqrt(n_out) x sqrt(n_out) grid so sparse regions and outliers survive,
+    then fill the remaining budget uniformly so dense regions stay dense.
+    """
+    n = len(x)
+    if n <= n_out:
+        return np.arange(n)
+
+    rng = np.random.default_rng(seed)
+    bins = max(int(np.sqrt(n_out)), 1)
+    x_cell = _bin(x, bins)
+    y_cell = _bin(y, bins)
+    order = rng.permutation(n)
+    _, first = np.unique((x_cell * bins + y_cell)[order], return_index=True)
+    representatives = order[first]
+
+    if len(representatives) >= n_out:
+        return np.sort(rng.choice(representatives, n_out, replace=False))
+
+    remaining = np.setdiff1d(np.arange(n), representatives, assume_unique=True)
+    fill = rng.choice(remaining, n_out - len(representatives), replace=False)
+    return np.sort(np.concatenate((representatives, fill)))
+
+
+def _bin(values, bins):
+    low, high = values.min(), values.max()
+    span = high - low if high > low else 1.0
+    return np.clip(((values - low) / span * bins).astype(np.int64), 0, bins - 1)
+
+
+def _as_float(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.astype('int64').to_numpy(dtype=np.float64)
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+        return None
+    return series.to_numpy(dtype=np.float64)
+
+
+def reduce_for_chart(plot_data, chart_type, x_column, y_column, max_points=CHART_MAX_POINTS):
+    """
+    Bound the number of rows sent to the frontend for a chart.
+
+    Line and area charts are reduced with LTTB, scatter charts with grid-based
+    density sampling; both are projected onto the plotted columns. Categorical
+    charts keep their first CHART_MAX_CATEGORIES rows.
+    """
+    xy_chart = chart_type in ('line', 'area', 'scatter')
+    if not xy_chart or not x_column or not y_column or x_column not in plot_data or y_column not in plot_data:
+        if len(plot_data) > CHART_MAX_CATEGORIES:
+            print(f"[WARNING] Data truncated to {CHART_MAX_CATEGORIES} rows for frontend rendering")
+            return plot_data.head(CHART_MAX_CATEGORIES)
+        return plot_data
+
+    if len(plot_data) <= max_points:
+        return plot_data
+
+    keep = [x_column, y_column] + [c for c in (f"{y_column}_ci_low", f"{y_column}_ci_high") if c in plot_data]
+    data = plot_data[list(dict.fromkeys(keep))].dropna(subset=[x_column, y_column])
+    x = _as_float(data[x_column])
+    y = _as_float(data[y_column])
+
+    if chart_type == 'scatter':
+        if x is not None and y is not None:
+            indices = density_sample_indices(x, y, max_points)
+            method = "density"
+        else:
+            rng = np.random.default_rng(0)
+            indices = np.sort(rng.choice(len(data), min(max_points, len(data)), replace=False))
+            method = "uniform"
+    else:
+        if x is not None:
+            order = np.argsort(x, kind='stable')
+            data = data.iloc[order]
+            x = x[order]
+            if y is not None:
+                y = y[order]
+        else:
+            # Categorical x: keep the given order and use positions as coordinates
+            x = np.arange(len(data), dtype=np.float64)
+        if y is not None:
+            indices = lttb_indices(x, y, max_points)
+            method = "lttb"
+        else:
+            indices = np.linspace(0, len(data) - 1, max_points).astype(np.int64)
+            method = "even"
+
+    reduced = data.iloc[indices]
+    print(f"[DOWNSAMPLE] {chart_type}: {len(plot_data)} -> {len(reduced)} points ({method})")
+    return reduced
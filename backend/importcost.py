@@ -0,0 +1,29 @@
+import sys
+import time
+from contextlib import contextmanager
+
+# Heavy stacks that the API only loads on first use
+DEFERRED_MODULES = ('matplotlib', 'seaborn', 'pypdf')
+
+# Key: label, Value: seconds spent importing
+import_times = {}
+
+
+@contextmanager
+def timed(label):
+    """Record how long the imports inside the block take under `label`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        import_times[label] = import_times.get(label, 0.0) + time.perf_counter() - start
+
+
+def report():
+    """Print import costs so far, slowest first, and which heavy stacks are still unloaded."""
+    print("[STARTUP] Import costs:")
+    for label, seconds in sorted(import_times.items(), key=lambda item: item[1], reverse=True):
+        print(f"[STARTUP]   {label:<32} {seconds * 1000:8.1f} ms")
+    deferred = [name for name in DEFERRED_MODULES if name not in sys.modules]
+    if deferred:
+        print(f"[STARTUP] Deferred until first use: {', '.join(deferred)}")
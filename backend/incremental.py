@@ -0,0 +1,109 @@
+import pandas as pd
+
+# Aggregations that can be updated from appended rows alone
+DECOMPOSABLE = ('count', 'sum', 'mean', 'min', 'max')
+
+
+def is_numeric(dtype):
+    """Whether columns of `dtype` get numeric statistics and value aggregates (booleans do not)."""
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _min(a, b):
+    values = [v for v in (a, b) if not pd.isna(v)]
+    return min(values) if values else a
+
+
+def _max(a, b):
+    values = [v for v in (a, b) if not pd.isna(v)]
+    return max(values) if values else a
+
+
+class GroupedAggregate:
+    """
+    Mergeable per-group state of one value column: non-null count, sum, min
+    and max, from which every DECOMPOSABLE aggregation follows. Without a
+    value column only row counts per group are kept (groupby().size(),
+    value_counts()). Groups are kept sorted, as groupby returns them.
+    """
+
+    def __init__(self, state, value_column):
+        self.state = state
+        self.value_column = value_column
+
+    @classmethod
+    def from_frame(cls, df, group_column, value_column=None):
+        grouped = df.groupby(group_column)
+        if value_column is None:
+            return cls(grouped.size().to_frame('count'), None)
+        return cls(grouped[value_column].agg(['count', 'sum', 'min', 'max']), value_column)
+
+    def merge(self, other):
+        grouped = pd.concat([self.state, other.state]).groupby(level=0)
+        if self.value_column is None:
+            state = grouped.sum()
+        else:
+            state = grouped.agg({'count': 'sum', 'sum': 'sum', 'min': 'min', 'max': 'max'})
+        return GroupedAggregate(state, self.value_column)
+
+    def result(self, aggregation):
+        """Series indexed by group, equal to groupby(...).agg(aggregation) (or .size() without a value column)."""
+        if aggregation == 'mean':
+            series = self.state['sum'] / self.state['count']
+        else:
+            series = self.state[aggregation]
+        series.index.name = self.state.index.name
+        return series.rename(self.value_column or 'count')
+
+
+class DatasetProfile:
+    """
+    Per-column statistics behind get_data_summary, updatable with appended
+    rows: non-null count, sum, min and max of numeric columns, full value
+    counts of the others.
+    """
+
+    def __init__(self, df):
+        self.rows = 0
+        self.dtypes = {}
+        self.numeric = {}
+        self.counts = {}
+        self.update(df, df.dtypes)
+
+    def update(self, df, dtypes):
+        """Add the rows of `df`; `dtypes` are those of the combined frame. Raises ValueError if the schema changed."""
+        if self.dtypes and list(dtypes.index) != list(self.dtypes):
+            raise ValueError("Columns changed")
+        for column in df.columns:
+            series = df[column]
+            numeric = is_numeric(dtypes[column])
+            if self.dtypes and numeric != (column in self.numeric):
+                raise ValueError(f"Column '{column}' changed between numeric and non-numeric")
+            if numeric:
+                count, total, low, high = series.count(), series.sum(), series.min(), series.max()
+                if column in self.numeric:
+                    old_count, old_total, old_low, old_high = self.numeric[column]
+                    count, total, low, high = old_count + count, old_total + total, _min(old_low, low), _max(old_high, high)
+                self.numeric[column] = (count, total, low, high)
+            else:
+                counts = series.value_counts()
+                if column in self.counts:
+                    counts = self.counts[column].add(counts, fill_value=0).astype('int64')
+                self.counts[column] = counts
+        self.rows += len(df)
+        self.dtypes = dict(dtypes)
+
+    def text(self, top=3):
+        """Shape and per-column statistics, compact enough for a prompt."""
+        lines = [f"Rows: {self.rows}", "Columns:"]
+        for column, dtype in self.dtypes.items():
+            if column in self.numeric:
+                count, total, low, high = self.numeric[column]
+                mean = round(total / count, 3) if count else float('nan')
+                lines.append(f"  {column} ({dtype}): min={low}, max={high}, mean={mean}")
+            else:
+                counts = self.counts[column]
+                counts = counts[counts > 0]  # categoricals count unused categories too
+                top_values = ", ".join(f"{value} ({count})" for value, count in counts.nlargest(top).items())
+                lines.append(f"  {column} ({dtype}): {len(counts)} distinct, top: {top_values}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,154 @@
+import os
+import time
+import uuid
+import heapq
+import itertools
+import threading
+import traceback
+
+# Worker threads that run background jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Queued (not yet running) jobs accepted before submit starts refusing
+JOB_QUEUE_LIMIT = int(os.getenv("JOB_QUEUE_LIMIT", "100"))
+# Finished jobs and their results are kept this long for polling
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+DEFAULT_PRIORITY = 5
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    """Raised by a job body to fail the job with a message and no traceback."""
+
+
+class Job:
+    def __init__(self, kind, func, args, kwargs, priority):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.priority = priority
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "priority": self.priority,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+
+class JobScheduler:
+    """
+    In-process priority job queue served by a bounded pool of worker threads.
+
+    Higher priority runs first, FIFO within a priority. Queued jobs can be
+    cancelled outright; a running job cannot be interrupted, but its result
+    is discarded and it is reported as cancelled.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, queue_limit=JOB_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._heap = []
+        self._order = itertools.count()
+        self._jobs = {}
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"job-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, kind, func, *args, priority=DEFAULT_PRIORITY, **kwargs):
+        job = Job(kind, func, args, kwargs, priority)
+        with self._condition:
+            self._prune()
+            if self._queued >= self.queue_limit:
+                raise QueueFull(f"Job queue is full ({self.queue_limit} queued jobs)")
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (-priority, next(self._order), job))
+            self._queued += 1
+            self._ensure_workers()
+            self._condition.notify()
+        print(f"[JOB] Queued {kind} job {job.id} (priority {priority})")
+        return job
+
+    def get(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job; returns the job, or None if it does not exist."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in ("done", "failed", "cancelled"):
+                return job
+            job.cancel_requested = True
+            if job.status == "queued":
+                # Left in the heap and skipped when popped
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                self._queued -= 1
+            return job
+
+    def stats(self):
+        with self._condition:
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            return {"queued": self._queued, "running": running, "workers": self.workers}
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job.status == "cancelled":
+                    continue
+                self._queued -= 1
+                job.status = "running"
+                job.started_at = time.time()
+
+            try:
+                result, error = job._func(*job._args, **job._kwargs), None
+            except JobFailed as e:
+                result, error = None, str(e)
+            except Exception as e:
+                traceback.print_exc()
+                result, error = None, str(e)
+
+            with self._condition:
+                job.finished_at = time.time()
+                if job.cancel_requested:
+                    job.status = "cancelled"
+                elif error is not None:
+                    job.status, job.error = "failed", error
+                else:
+                    job.status, job.result = "done", result
+            print(f"[JOB] {job.kind} job {job.id} {job.status} in {job.finished_at - job.started_at:.2f}s")
+
+
+scheduler = JobScheduler()
@@ -0,0 +1,176 @@
+import os
+import json
+import mmap
+import hashlib
+import threading
+from collections.abc import MutableMapping
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: index writes are still atomic, just not serialized
+    fcntl = None
+
+KB_STORE_DIR = os.getenv("KB_STORE_DIR", os.path.join("static", ".kb"))
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class StoredChunk(MutableMapping):
+    """
+    Chunk mapping whose "text" is decoded from the memory-mapped blob on each
+    access instead of held in memory; every other field is stored as usual.
+    The chunks of one load share the mmap, which closes once all are dropped.
+    """
+    __slots__ = ('_fields', '_blob', '_start', '_end')
+
+    def __init__(self, blob, start, end, **fields):
+        self._fields = fields
+        self._blob = blob
+        self._start = start
+        self._end = end
+
+    def __getitem__(self, key):
+        if key == "text":
+            return self._blob[self._start:self._end].decode('utf-8')
+        return self._fields[key]
+
+    def __setitem__(self, key, value):
+        if key == "text":
+            raise TypeError("Stored chunk text is read-only")
+        self._fields[key] = value
+
+    def __delitem__(self, key):
+        del self._fields[key]
+
+    def __iter__(self):
+        yield "text"
+        yield from self._fields
+
+    def __len__(self):
+        return len(self._fields) + 1
+
+
+class KnowledgeBaseStore:
+    """
+    On-disk store of extracted document chunks, keyed by the SHA-256 of the document.
+
+    Per document, chunk texts are concatenated into one UTF-8 blob
+    (`<hash>.text`) with a (start, end, page) row per chunk in `<hash>.chunks.npy`;
+    both are memory-mapped on load. Extra per-document arrays such as search
+    indexes live next to them as `<hash>.<name>.npy`. `index.json` remembers the
+    hash of every source path by mtime and size, so unchanged files are not
+    even re-hashed on restart.
+    """
+
+    def __init__(self, directory=KB_STORE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        self._lock_path = os.path.join(directory, LOCK_FILE)
+        self._lock = threading.Lock()
+
+    def _path(self, doc_hash, suffix):
+        return os.path.join(self.directory, f"{doc_hash}.{suffix}")
+
+    def _read_index(self):
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"sources": {}}
+
+    def _update_index(self, update):
+        with self._lock, open(self._lock_path, 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                update(index)
+                tmp_path = f"{self._index_path}.tmp{os.getpid()}"
+                with open(tmp_path, 'w') as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, self._index_path)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def document_hash(self, path):
+        """Content hash of `path`, served from the index while the file's mtime and size are unchanged."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self._read_index()["sources"].get(path)
+        if known and known["mtime"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+            return known["hash"]
+
+        doc_hash = file_hash(path)
+
+        def update(index):
+            index["sources"][path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": doc_hash}
+        self._update_index(update)
+        return doc_hash
+
+    def has(self, doc_hash):
+        return os.path.exists(self._path(doc_hash, "chunks.npy"))
+
+    def save_chunks(self, doc_hash, chunks):
+        """Persist [{"text": str, "page": int, ...}] for `doc_hash`."""
+        encoded = [chunk["text"].encode('utf-8') for chunk in chunks]
+        ends = np.cumsum([len(text) for text in encoded], dtype=np.int64)
+        rows = np.zeros((len(chunks), 3), dtype=np.int64)
+        if len(chunks):
+            rows[:, 0] = ends - [len(text) for text in encoded]
+            rows[:, 1] = ends
+            rows[:, 2] = [chunk["page"] for chunk in chunks]
+
+        text_path = self._path(doc_hash, "text")
+        with open(f"{text_path}.tmp{os.getpid()}", 'wb') as f:
+            f.write(b''.join(encoded))
+        os.replace(f"{text_path}.tmp{os.getpid()}", text_path)
+        # The chunk table is written last: its presence marks the document as complete
+        self.save_array(doc_hash, "chunks", rows)
+
+    def load_chunks(self, doc_hash, source):
+        """StoredChunk mappings for `doc_hash`; texts stay in the memory-mapped blob until read."""
+        rows = self.load_array(doc_hash, "chunks")
+        if rows is None or len(rows) == 0:
+            return []
+        with open(self._path(doc_hash, "text"), 'rb') as f:
+            # Not cached here: the mmap lives as long as the returned chunks, so replacing a document closes it
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return [
+            StoredChunk(blob, start, end, source=source, page=page)
+            for start, end, page in rows.tolist()
+        ]
+
+    def save_array(self, doc_hash, name, array):
+        path = self._path(doc_hash, f"{name}.npy")
+        tmp_path = f"{path}.tmp{os.getpid()}.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+    def save_term_rows(self, doc_hash, name, terms):
+        """Persist CSR arrays (indptr, indices, values) as three arrays under `name`."""
+        for part, array in zip(("indptr", "indices", "values"), terms):
+            self.save_array(doc_hash, f"{name}.{part}", array)
+
+    def load_term_rows(self, doc_hash, name):
+        """Memory-mapped CSR arrays saved by save_term_rows, or None."""
+        # Content-addressed, so a set interrupted while being rewritten still holds the same arrays
+        arrays = [self.load_array(doc_hash, f"{name}.{part}") for part in ("indptr", "indices", "values")]
+        return None if any(array is None for array in arrays) else tuple(arrays)
+
+    def load_array(self, doc_hash, name):
+        """Memory-mapped array `name` of `doc_hash`, or None if it was never saved."""
+        path = self._path(doc_hash, f"{name}.npy")
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode='r')
@@ -0,0 +1,258 @@
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from fastapi.concurrency import run_in_threadpool
+
+# Completions allowed in flight at once per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Token bucket: sustained requests per second and burst size
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "2"))
+LLM_BURST = int(os.getenv("LLM_BURST", "4"))
+# Retries on 429, with full-jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = 20.0
+# Send a duplicate request if the first has not answered after this many seconds (0 disables hedging)
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "0"))
+
+# Lower runs first; unknown roles are treated as 'user'
+ROLE_PRIORITY = {"admin": 0, "user": 1}
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def remaining(deadline):
+    """Seconds left until a time.monotonic() deadline, None if there is no deadline."""
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def role_priority(role):
+    return ROLE_PRIORITY.get(role, ROLE_PRIORITY["user"])
+
+
+def _is_rate_limited(error):
+    return getattr(error, "status_code", None) == 429 or "429" in str(error)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def wait_seconds(self):
+        """Seconds until a token is available, if nobody else takes one first."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def try_acquire(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class LLMGateway:
+    """
+    Admission control in front of an OpenAI-compatible client, per worker process.
+
+    Requests wait in a priority queue (admin before user, FIFO within a role)
+    for one of `max_concurrency` slots, then take a token from a rate-limiting
+    bucket before each attempt. 429 responses are retried with full-jitter
+    exponential backoff, honouring Retry-After when the server sends it.
+    Blocking client calls run in the threadpool so the event loop stays free.
+
+    With a deadline, queueing, each attempt and retry backoff are all bounded
+    by the time left, and DeadlineExceeded is raised when it runs out. With
+    hedging, an attempt still unanswered after `hedge_delay` seconds gets a
+    duplicate request (if the rate limit allows) and the first answer wins.
+    """
+
+    def __init__(self, client, max_concurrency=LLM_MAX_CONCURRENCY, rate=LLM_RATE_PER_SECOND, burst=LLM_BURST,
+                 max_retries=LLM_MAX_RETRIES, hedge_delay=LLM_HEDGE_DELAY_SECONDS):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.hedge_delay = hedge_delay
+        self._bucket = TokenBucket(rate, burst)
+        self._active = 0
+        self._waiters = []
+        self._order = itertools.count()
+        # Metrics
+        self.requests = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.deadline_exceeded = 0
+        self.rate_limited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def queue_depth(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    async def _admit(self, priority):
+        if self._active < self.max_concurrency and not self.queue_depth:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release()
+            raise
+
+    def _release(self):
+        # Hand the slot straight to the best waiter, or give it back
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    async def _invoke(self, kwargs, deadline):
+        left = remaining(deadline)
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded("LLM deadline reached")
+            kwargs = dict(kwargs, timeout=left)
+        try:
+            return await run_in_threadpool(self.client.chat.completions.create, **kwargs)
+        except Exception:
+            if deadline is not None and remaining(deadline) <= 0:
+                raise DeadlineExceeded("LLM deadline reached")
+            raise
+
+    async def _attempt(self, kwargs, deadline):
+        """One attempt, hedged with a duplicate request if the first is slow."""
+        primary = asyncio.ensure_future(self._invoke(kwargs, deadline))
+        pending = {primary}
+        try:
+            if self.hedge_delay > 0:
+                left = remaining(deadline)
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_delay if left is None else min(self.hedge_delay, max(left, 0)))
+                if not done and (left is None or left > self.hedge_delay) and self._bucket.try_acquire():
+                    self.hedged += 1
+                    pending.add(asyncio.ensure_future(self._invoke(kwargs, deadline)))
+
+            error = None
+            while pending:
+                left = remaining(deadline)
+                done, pending = await asyncio.wait(pending, timeout=None if left is None else max(left, 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded("LLM deadline reached")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing request's thread cannot be interrupted, its answer is just dropped
+            for task in pending:
+                task.cancel()
+
+    async def _acquire_token(self, deadline):
+        left = remaining(deadline)
+        if left is None:
+            await self._bucket.acquire()
+            return
+        try:
+            # Fail at once when the rate limit alone outlasts the deadline
+            if self._bucket.wait_seconds() >= left:
+                raise asyncio.TimeoutError
+            await asyncio.wait_for(self._bucket.acquire(), timeout=max(left, 0))
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded("Deadline reached while waiting for the LLM rate limit")
+
+    async def create(self, priority=ROLE_PRIORITY["user"], deadline=None, **kwargs):
+        """client.chat.completions.create(**kwargs) under admission control, bounded by a time.monotonic() deadline."""
+        queued_at = time.monotonic()
+        try:
+            left = remaining(deadline)
+            if left is None:
+                await self._admit(priority)
+            else:
+                await asyncio.wait_for(self._admit(priority), timeout=max(left, 0))
+        except asyncio.TimeoutError:
+            self.deadline_exceeded += 1
+            raise DeadlineExceeded("Deadline reached while queued for the LLM")
+        waited = time.monotonic() - queued_at
+        self.requests += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self._acquire_token(deadline)
+                try:
+                    return await self._attempt(kwargs, deadline)
+                except DeadlineExceeded:
+                    self.deadline_exceeded += 1
+                    raise
+                except Exception as e:
+                    if not _is_rate_limited(e):
+                        raise
+                    self.rate_limited += 1
+                    delay = _retry_after(e) or random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+                    left = remaining(deadline)
+                    if attempt == self.max_retries or (left is not None and delay >= left):
+                        raise
+                    self.retries += 1
+                    print(f"[LLM] Rate limited, retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+        finally:
+            self._release()
+
+    def metrics(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self._active,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "deadline_exceeded": self.deadline_exceeded,
+            "wait_seconds_total": round(self.wait_seconds_total, 4),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.requests, 4) if self.requests else 0.0,
+            "wait_seconds_max": round(self.wait_seconds_max, 4)
+        }
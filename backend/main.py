@@ -1,23 +1,47 @@
 import os
-from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-import shutil
-from openai import OpenAI
-from dotenv import load_dotenv
-from typing import List, Optional
 import sys
-import json
 from pathlib import Path
 
 # Add current directory to path if running as script
 if __name__ == "__main__":
     sys.path.append(str(Path(__file__).parent))
 
-from tools import tools_list, load_data, get_data_summary
-from database import engine, Base
+import importcost
 
+with importcost.timed("fastapi"):
+    from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException, Query
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.middleware.gzip import GZipMiddleware
+    from fastapi.responses import JSONResponse, ORJSONResponse, Response
+    from fastapi.staticfiles import StaticFiles
+    from fastapi.concurrency import run_in_threadpool
+    from pydantic import BaseModel
+import shutil
+import uuid
+import base64
+import inspect
+import functools
+with importcost.timed("openai"):
+    from openai import OpenAI
+from dotenv import load_dotenv
+from typing import List, Optional
+import json
+import time
+import asyncio
+
+# matplotlib, seaborn and pypdf are not imported here, tools loads them on first use
+with importcost.timed("tools (pandas, numpy)"):
+    from tools import tools_list, load_data, append_data, get_data_summary, summarize_tool_result
+    from tools import build_chart_config, build_dashboard, create_visualization, query_knowledge_base
+    from tools import create_dashboard_image
+    from tools import dataset_loaded
+import serialization
+import jobs
+import llm_gateway
+import telemetry
+import warmup
+with importcost.timed("database (sqlalchemy)"):
+    from database import engine, Base, SessionLocal
 
 load_dotenv()
 
@@ -29,7 +53,8 @@ from models import ChatMessage, User
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+# orjson renders numpy values natively and much faster than the stdlib encoder
+app = FastAPI(default_response_class=ORJSONResponse if serialization.orjson else JSONResponse)
 
 
 # CORS
@@ -41,23 +66,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression; brotli is used when brotli-asgi is installed, gzip otherwise
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
 # Static files for charts
 if not os.path.exists("static"):
     os.makedirs("static")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # NVIDIA API Setup (OpenAI-compatible)
+# LLM_BASE_URL can point at any OpenAI-compatible server, e.g. a local fake for load tests
 NVIDIA_API_KEY = os.getenv("NVIDIA_API_KEY")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://integrate.api.nvidia.com/v1")
 if NVIDIA_API_KEY:
     client = OpenAI(
-        base_url="https://integrate.api.nvidia.com/v1",
-        api_key=NVIDIA_API_KEY
+        base_url=LLM_BASE_URL,
+        api_key=NVIDIA_API_KEY,
+        # Retries on 429 are handled by the gateway, with jitter and role priority
+        max_retries=0
     )
-    MODEL_NAME = "openai/gpt-oss-120b"
+    MODEL_NAME = os.getenv("LLM_MODEL", "openai/gpt-oss-120b")
+    gateway = llm_gateway.LLMGateway(client)
     print(f"NVIDIA API configured with model: {MODEL_NAME}")
 else:
     print("Warning: NVIDIA_API_KEY not found.")
     client = None
+    gateway = None
+
+# Time budget for one /chat request (LLM calls and tools); a request may only shorten it
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "60"))
+# Below this much time left, charts are returned without asking the model for a narrative
+LLM_MIN_NARRATIVE_SECONDS = float(os.getenv("LLM_MIN_NARRATIVE_SECONDS", "3"))
 
 # OpenAI-compatible tool definitions
 tools_openai_format = [
@@ -96,6 +140,10 @@ tools_openai_format = [
                                     "type": "string",
                                     "enum": ["count", "sum", "mean", "median", "min", "max"],
                                     "description": "Aggregation function"
+                                },
+                                "approximate": {
+                                    "type": "boolean",
+                                    "description": "Use fast sampled aggregation with error bounds on very large files (optional)"
                                 }
                             },
                             "required": ["chart_type", "x_column", "title"]
@@ -152,6 +200,10 @@ tools_openai_format = [
                     "group_by": {
                         "type": "string",
                         "description": "Column to group by before aggregation (optional)"
+                    },
+                    "approximate": {
+                        "type": "boolean",
+                        "description": "Use fast sampled aggregation with error bounds on very large files; the exact result replaces it on the next identical request (optional)"
                     }
                 },
                 "required": ["chart_type"]
@@ -211,11 +263,57 @@ tools_openai_format = [
         }
     },
 
+    {
+        "type": "function",
+        "function": {
+            "name": "create_dashboard_image",
+            "description": "Render several charts as static images in one pass, by default as panels of a single image. Use instead of repeated create_visualization calls when several image charts are wanted.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "chart_specs": {
+                        "type": "array",
+                        "description": "Charts to draw, each with the parameters of create_visualization",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "chart_type": {"type": "string", "enum": ["bar", "line", "scatter", "hist", "pie", "box", "violin", "heatmap", "area", "count"]},
+                                "x_column": {"type": "string"},
+                                "y_column": {"type": "string"},
+                                "title": {"type": "string"},
+                                "filename": {"type": "string"},
+                                "filter_column": {"type": "string"},
+                                "filter_value": {"type": "string"},
+                                "aggregation": {"type": "string", "enum": ["count", "sum", "mean", "median", "min", "max"]},
+                                "group_by": {"type": "string"}
+                            },
+                            "required": ["chart_type"]
+                        }
+                    },
+                    "layout": {
+                        "type": "string",
+                        "enum": ["grid", "separate"],
+                        "description": "'grid' draws all charts in one image, 'separate' writes one image per chart (optional)"
+                    },
+                    "image_format": {
+                        "type": "string",
+                        "enum": ["png", "jpg", "svg"],
+                        "description": "Image format (optional)"
+                    },
+                    "dpi": {
+                        "type": "integer",
+                        "description": "Resolution of png and jpg images (optional)"
+                    }
+                },
+                "required": ["chart_specs"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
             "name": "get_data_summary",
-            "description": "Get a summary of all loaded data files including columns and sample data",
+            "description": "Get a compact profile of every loaded data file: row count, and per column its type with min/max/mean or distinct count and top values",
             "parameters": {
                 "type": "object",
                 "properties": {},
@@ -246,6 +344,7 @@ tools_openai_format = [
 @app.on_event("startup")
 async def startup_event():
     """Load all existing CSV/Excel files from static directory into memory"""
+    importcost.report()
     if os.path.exists("static"):
         for filename in os.listdir("static"):
             if filename.endswith(('.csv', '.xlsx', '.xls', '.pdf')):
@@ -255,11 +354,25 @@ async def startup_event():
                     print(f"Loaded existing file: {filename}")
                 except Exception as e:
                     print(f"Failed to load {filename}: {str(e)}")
+    if warmup.CACHE_WARMUP:
+        jobs.scheduler.submit("warmup", _warm_caches, priority=WARMUP_JOB_PRIORITY)
+
+def _warm_caches():
+    """Rebuild the charts asked for most often in recent chat history."""
+    db = SessionLocal()
+    try:
+        rows = db.query(ChatMessage.content).filter(ChatMessage.role == "model") \
+            .order_by(ChatMessage.timestamp.desc()).limit(warmup.WARMUP_HISTORY_MESSAGES).all()
+    finally:
+        db.close()
+    return warmup.warm(warmup.chart_specs(content for (content,) in rows), build_chart_config, dataset_loaded)
 
 # Models
 class ChatRequest(BaseModel):
     message: str
     role: str = "admin"
+    data_format: str = "records"  # 'records' or 'columnar' chart data
+    deadline_seconds: Optional[float] = None  # capped at CHAT_DEADLINE_SECONDS
 
 class ChatResponse(BaseModel):
     response_type: str = "text"  # 'text' or 'analytics'
@@ -270,15 +383,44 @@ class ChatResponse(BaseModel):
 
 # Routes
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), background: bool = False, append: bool = False, target: Optional[str] = None):
     try:
         # Ensure static directory exists
         os.makedirs("static", exist_ok=True)
         
-        file_location = os.path.abspath(os.path.join("static", file.filename))
+        if append:
+            # New rows only: kept apart so the dataset's own file is not overwritten
+            os.makedirs(APPEND_DIR, exist_ok=True)
+            file_location = os.path.abspath(os.path.join(APPEND_DIR, f"{uuid.uuid4().hex}-{file.filename}"))
+        else:
+            file_location = os.path.abspath(os.path.join("static", file.filename))
         with open(file_location, "wb+") as file_object:
             shutil.copyfileobj(file.file, file_object)
-        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if append:
+        target = target or file.filename
+        if background:
+            try:
+                job = jobs.scheduler.submit("append_data", _tool_job(_append_upload), file_location, target, priority=UPLOAD_JOB_PRIORITY)
+            except jobs.QueueFull as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            return {"info": f"file '{file.filename}' saved successfully", "status": "queued", "job_id": job.id}
+        msg = await run_in_threadpool(_append_upload, file_location, target)
+        if msg.startswith("Error"):
+            raise HTTPException(status_code=400, detail=msg)
+        return {"info": f"file '{file.filename}' appended to '{target}'", "status": msg}
+    
+    if background:
+        # Parse large workbooks and PDFs off the request; poll /jobs/{job_id}
+        try:
+            job = jobs.scheduler.submit("load_data", _tool_job(load_data), file_location, priority=UPLOAD_JOB_PRIORITY)
+        except jobs.QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return {"info": f"file '{file.filename}' saved successfully", "status": "queued", "job_id": job.id}
+    
+    try:
         # Load data into the tool context
         msg = load_data(file_location)
         
@@ -286,6 +428,95 @@ async def upload_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Uploads of rows to append wait here until they are merged into their dataset
+APPEND_DIR = os.path.join("static", ".appends")
+
+def _append_upload(file_location, target):
+    try:
+        return append_data(file_location, target)
+    finally:
+        os.remove(file_location)
+
+# Background jobs
+# Uploads run ahead of chart jobs so the data they need is there first
+UPLOAD_JOB_PRIORITY = 8
+# Cache warm-up yields to everything users asked for
+WARMUP_JOB_PRIORITY = 1
+
+def _tool_job(func):
+    """`func` as a job body: a tool result reporting an error fails the job instead of finishing it as done."""
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        result = func(*args, **kwargs)
+        if isinstance(result, dict) and "error" in result:
+            raise jobs.JobFailed(result["error"])
+        if isinstance(result, str) and result.startswith("Error"):
+            raise jobs.JobFailed(result)
+        return result
+    return run
+
+# Tools that can run as background jobs, by the name the LLM knows them under
+JOB_KINDS = {
+    "generate_chart_data": build_chart_config,
+    "generate_dashboard": build_dashboard,
+    "create_visualization": create_visualization,
+    "create_dashboard_image": create_dashboard_image,
+    "query_knowledge_base": query_knowledge_base,
+}
+
+class JobRequest(BaseModel):
+    kind: str
+    args: dict = {}
+    priority: int = jobs.DEFAULT_PRIORITY
+
+def _get_job_or_404(job_id: str):
+    job = jobs.scheduler.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(request: JobRequest):
+    func = JOB_KINDS.get(request.kind)
+    if func is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {request.kind}. Available: {list(JOB_KINDS)}")
+    try:
+        inspect.signature(func).bind(**request.args)
+    except TypeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid args for {request.kind}: {e}")
+    try:
+        # Bound up front, so args named like submit's own parameters reach the tool
+        job = jobs.scheduler.submit(request.kind, _tool_job(functools.partial(func, **request.args)), priority=request.priority)
+    except jobs.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return job.to_dict()
+
+@app.get("/jobs")
+def get_jobs_stats():
+    return jobs.scheduler.stats()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    return _get_job_or_404(job_id).to_dict()
+
+@app.get("/jobs/{job_id}/result")
+def get_job_result(job_id: str):
+    job = _get_job_or_404(job_id)
+    if job.status == "done":
+        return {"job_id": job.id, "status": job.status, "result": job.result}
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status == "cancelled":
+        raise HTTPException(status_code=410, detail=f"Job {job_id} was cancelled")
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = jobs.scheduler.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.to_dict()
+
 from database import engine, Base, get_db
 from models import ChatMessage, User
 from sqlalchemy.orm import Session
@@ -310,24 +541,41 @@ def get_history(role: str, db: Session = Depends(get_db)):
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db)):
+    with telemetry.trace("chat"):
+        return await _chat(request, db)
+
+async def _chat(request: ChatRequest, db: Session):
     if not NVIDIA_API_KEY:
         raise HTTPException(status_code=500, detail="NVIDIA API not configured")
+    if request.data_format not in serialization.DATA_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported data_format: {request.data_format}")
+    budget = CHAT_DEADLINE_SECONDS
+    if request.deadline_seconds is not None:
+        if request.deadline_seconds <= 0:
+            raise HTTPException(status_code=400, detail="deadline_seconds must be positive")
+        budget = min(budget, request.deadline_seconds)
+    deadline = time.monotonic() + budget
     
     try:
         # 1. Save User Message
         user_msg = ChatMessage(role="user", content=request.message, user_role=request.role)
         db.add(user_msg)
-        db.commit()
+        with telemetry.span("db_commit"):
+            db.commit()
 
         # 2. Reconstruct History for OpenAI format
         # OpenAI expects roles 'user' and 'assistant'
-        previous_messages = db.query(ChatMessage).filter(ChatMessage.user_role == request.role).order_by(ChatMessage.timestamp).all()
+        with telemetry.span("history_load"):
+            previous_messages = db.query(ChatMessage).filter(ChatMessage.user_role == request.role).order_by(ChatMessage.timestamp).all()
         
+        prompt_started = time.perf_counter()
         messages = []
         
         # Add system message with context
         import tools
-        files_info = f"Available data files: {list(tools.dataframes.keys())}. Active file: {tools.active_file}" if tools.dataframes else "No data files loaded yet."
+        tools.refresh_shared_state()
+        dataset_names = tools.dataset_names()
+        files_info = f"Available data files: {dataset_names}. Active file: {tools.active_file}" if dataset_names else "No data files loaded yet."
         
         system_instruction = f"""You are a data visualization assistant. {files_info}
 
@@ -365,19 +613,24 @@ Then respond: "."
         
         # Add current user message
         messages.append({"role": "user", "content": request.message})
+        telemetry.record("prompt_build", prompt_started)
 
         # 3. Get Response with tool calling
         try:
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=messages,
-                tools=tools_openai_format,
-                tool_choice="auto",
-                temperature=1,
-                top_p=1,
-                max_tokens=4096,
-                stream=False
-            )
+            priority = llm_gateway.role_priority(request.role)
+            with telemetry.span("llm_tool_selection"):
+                response = await gateway.create(
+                    priority,
+                    deadline=deadline,
+                    model=MODEL_NAME,
+                    messages=messages,
+                    tools=tools_openai_format,
+                    tool_choice="auto",
+                    temperature=1,
+                    top_p=1,
+                    max_tokens=4096,
+                    stream=False
+                )
             
             # Handle tool calls
             response_message = response.choices[0].message
@@ -386,6 +639,8 @@ Then respond: "."
             if tool_calls:
                 # Execute tool calls
                 messages.append(response_message)
+                # Structured tool results for this request, keyed by tool_call_id
+                tool_results = {}
                 
                 for tool_call in tool_calls:
                     function_name = tool_call.function.name
@@ -393,43 +648,68 @@ Then respond: "."
                     
                     print(f"[TOOL CALL] {function_name} with args: {function_args}")
                     
-                    # Execute the function
+                    # Execute the function off the event loop, so concurrent chats can overlap
+                    # and identical chart requests can coalesce
                     if function_name == "generate_dashboard":
-                        from tools import generate_dashboard
-                        function_response = generate_dashboard(**function_args)
+                        function = build_dashboard
                     elif function_name == "generate_chart_data":
-                        from tools import generate_chart_data
-                        function_response = generate_chart_data(**function_args)
+                        function = build_chart_config
                     elif function_name == "create_visualization":
-                        from tools import create_visualization
-                        function_response = create_visualization(**function_args)
+                        function = create_visualization
+                    elif function_name == "create_dashboard_image":
+                        function = create_dashboard_image
                     elif function_name == "get_data_summary":
-                        from tools import get_data_summary
-                        function_response = get_data_summary()
+                        function, function_args = get_data_summary, {}
                     elif function_name == "query_knowledge_base":
-                        from tools import query_knowledge_base
-                        function_response = query_knowledge_base(**function_args)
+                        function = query_knowledge_base
                     else:
+                        function = None
+                    
+                    left = llm_gateway.remaining(deadline)
+                    if function is None:
                         function_response = f"Unknown function: {function_name}"
+                    elif left <= 0:
+                        function_response = {"error": f"Skipped {function_name}: request deadline reached"}
+                    else:
+                        try:
+                            # A timed-out tool keeps running in its thread, only its result is dropped
+                            with telemetry.span(f"tool:{function_name}"):
+                                function_response = await asyncio.wait_for(run_in_threadpool(function, **function_args), timeout=left)
+                        except asyncio.TimeoutError:
+                            print(f"[DEADLINE] {function_name} did not finish in time")
+                            function_response = {"error": f"{function_name} did not finish before the request deadline"}
+                    
+                    tool_results[tool_call.id] = function_response
                     
-                    # Add function response to messages
+                    # Only a compact summary goes back to the model, the full result stays here
                     messages.append({
                         "tool_call_id": tool_call.id,
                         "role": "tool",
                         "name": function_name,
-                        "content": str(function_response)
+                        "content": summarize_tool_result(function_name, function_response)
                     })
                 
-                # Get final response after tool execution
-                second_response = client.chat.completions.create(
-                    model=MODEL_NAME,
-                    messages=messages,
-                    temperature=1,
-                    top_p=1,
-                    max_tokens=4096,
-                    stream=False
-                )
-                response_text = second_response.choices[0].message.content
+                # Get final response after tool execution, unless too little time is left for it;
+                # charts are still returned then, with a stock caption
+                response_text = None
+                if llm_gateway.remaining(deadline) >= LLM_MIN_NARRATIVE_SECONDS:
+                    try:
+                        with telemetry.span("llm_narrative"):
+                            second_response = await gateway.create(
+                                priority,
+                                deadline=deadline,
+                                model=MODEL_NAME,
+                                messages=messages,
+                                temperature=1,
+                                top_p=1,
+                                max_tokens=4096,
+                                stream=False
+                            )
+                        response_text = second_response.choices[0].message.content
+                    except llm_gateway.DeadlineExceeded:
+                        print("[DEADLINE] Skipping the narrative, returning tool results")
+                else:
+                    print("[DEADLINE] Too little time left for the narrative, returning tool results")
                 
                 # Transform response if generate_chart_data or generate_dashboard was called
                 has_chart_data = any(tc.function.name in ["generate_chart_data", "generate_dashboard"] for tc in tool_calls)
@@ -439,48 +719,18 @@ Then respond: "."
                     charts = []
                     kpis = []
                     
-                    # Extract chart data from tool responses
-                    for i, tool_call in enumerate(tool_calls):
+                    # Collect chart data from the structured tool results
+                    for tool_call in tool_calls:
+                        result = tool_results.get(tool_call.id)
+                        if not isinstance(result, dict):
+                            continue
                         if tool_call.function.name == "generate_dashboard":
-                            # Handle dashboard response (multiple charts in one response)
-                            for msg in messages:
-                                if isinstance(msg, dict):
-                                    msg_role = msg.get("role")
-                                    msg_tool_call_id = msg.get("tool_call_id")
-                                else:
-                                    msg_role = getattr(msg, "role", None)
-                                    msg_tool_call_id = getattr(msg, "tool_call_id", None)
-                                
-                                if msg_role == "tool" and msg_tool_call_id == tool_call.id:
-                                    try:
-                                        content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", None)
-                                        dashboard_data = json.loads(content)
-                                        if "charts" in dashboard_data:
-                                            charts.extend(dashboard_data["charts"])
-                                    except Exception as e:
-                                        print(f"[ERROR] Failed to parse dashboard: {e}")
-                        
-                        elif tool_call.function.name == "generate_chart_data":
-                            # Find the corresponding tool response
-                            for msg in messages:
-                                # Handle both dict and object types
-                                if isinstance(msg, dict):
-                                    msg_role = msg.get("role")
-                                    msg_tool_call_id = msg.get("tool_call_id")
-                                else:
-                                    msg_role = getattr(msg, "role", None)
-                                    msg_tool_call_id = getattr(msg, "tool_call_id", None)
-                                
-                                if msg_role == "tool" and msg_tool_call_id == tool_call.id:
-                                    try:
-                                        # Get content from dict or object
-                                        content = msg.get("content") if isinstance(msg, dict) else getattr(msg, "content", None)
-                                        chart_config = json.loads(content)
-                                        if "error" not in chart_config:
-                                            charts.append(chart_config)
-                                    except Exception as e:
-                                        print(f"[ERROR] Failed to parse chart config: {e}")
-                                        pass
+                            charts.extend(result.get("charts", []))
+                        elif tool_call.function.name == "generate_chart_data" and "error" not in result:
+                            charts.append(result)
+                    
+                    if request.data_format == 'columnar':
+                        charts = [serialization.chart_to_format(chart, 'columnar') for chart in charts]
                     
                     # Build dashboard response
                     dashboard_data = {
@@ -491,24 +741,39 @@ Then respond: "."
                         "tables": []
                     }
                     
+                    # Serialize once, the same JSON is stored and sent
+                    with telemetry.span("serialization"):
+                        dashboard_json = serialization.dumps(dashboard_data)
+                    
                     # Save to database with special marker
                     model_msg = ChatMessage(
                         role="model",
-                        content=json.dumps(dashboard_data),
+                        content=dashboard_json,
                         user_role=request.role
                     )
                     db.add(model_msg)
-                    db.commit()
+                    with telemetry.span("db_commit"):
+                        db.commit()
                     
-                    return ChatResponse(
-                        response_type="analytics",
-                        response=response_text,
-                        dashboard_data=dashboard_data
+                    return Response(
+                        content=serialization.embed(
+                            {"response_type": "analytics", "response": response_text or "", "image_url": None},
+                            dashboard_data=dashboard_json
+                        ),
+                        media_type="application/json"
                     )
 
             else:
                 response_text = response_message.content
             
+            if tool_calls and response_text is None and llm_gateway.remaining(deadline) < LLM_MIN_NARRATIVE_SECONDS:
+                # No time for the narrative: return what the tools produced (image links, passages) as is
+                finished = [result for result in tool_results.values() if isinstance(result, str) and not result.startswith("Error")]
+                if finished:
+                    response_text = "\n\n".join(finished)
+                else:
+                    response_text = "The AI model did not respond in time. Please try again."
+            
             # Handle empty responses
             if not response_text or response_text.strip() == "":
                 print("[WARNING] Model returned empty response, using fallback")
@@ -551,7 +816,9 @@ Then respond: "."
             print(f"API Error: {error_msg}")
             
             # Check if it's a quota error
-            if "quota" in error_msg.lower() or "429" in error_msg:
+            if isinstance(api_error, llm_gateway.DeadlineExceeded):
+                response_text = "The AI model did not respond in time. Please try again."
+            elif "quota" in error_msg.lower() or "429" in error_msg:
                 response_text = "I've reached my API quota limit. Please try again later or contact the administrator to upgrade the API plan."
             elif "empty" in error_msg.lower():
                 response_text = "I received an empty response from the AI model. This might be due to API issues. Please try rephrasing your question or try again in a moment."
@@ -560,13 +827,15 @@ Then respond: "."
             
             model_msg = ChatMessage(role="model", content=response_text, user_role=request.role)
             db.add(model_msg)
-            db.commit()
+            with telemetry.span("db_commit"):
+                db.commit()
             return ChatResponse(response=response_text)
 
         # 4. Save Model Response
         model_msg = ChatMessage(role="model", content=response_text, user_role=request.role)
         db.add(model_msg)
-        db.commit()
+        with telemetry.span("db_commit"):
+            db.commit()
         
         return ChatResponse(response=response_text)
     except Exception as e:
@@ -574,6 +843,42 @@ Then respond: "."
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format: stage latencies, cache hit rates, dataset memory, LLM gateway and job queue."""
+    import tools
+    lines = telemetry.render()
+    lines += telemetry.format_metric(
+        "singleflight_calls_total", "counter", "Coalesced tool computations by outcome",
+        [({"result": "executed"}, tools._inflight.executed), ({"result": "shared"}, tools._inflight.shared)]
+    )
+    usage = tools.dataset_memory()
+    lines += telemetry.format_metric(
+        "dataset_memory_bytes", "gauge", "Deep in-memory size of each loaded dataset",
+        [({"dataset": name}, size) for name, (_, size) in usage.items()]
+    )
+    lines += telemetry.format_metric(
+        "dataset_rows", "gauge", "Rows in each loaded dataset",
+        [({"dataset": name}, rows) for name, (rows, _) in usage.items()]
+    )
+    lines += telemetry.format_metric(
+        "knowledge_base_chunks", "gauge", "Text chunks in the knowledge base", [({}, len(tools.knowledge_base))]
+    )
+    if gateway:
+        for key, value in gateway.metrics().items():
+            kind = "gauge" if key in ("queue_depth", "in_flight", "max_concurrency", "wait_seconds_avg", "wait_seconds_max") else "counter"
+            name = f"llm_{key}" if kind == "gauge" or key.endswith("_total") else f"llm_{key}_total"
+            lines += telemetry.format_metric(name, kind, f"LLM gateway {key.replace('_', ' ')}", [({}, value)])
+    for key, value in jobs.scheduler.stats().items():
+        lines += telemetry.format_metric(f"jobs_{key}", "gauge", f"Background jobs {key}", [({}, value)])
+    return Response(content="\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/llm/metrics")
+def get_llm_metrics():
+    if not gateway:
+        raise HTTPException(status_code=500, detail="NVIDIA API not configured")
+    return gateway.metrics()
+
 @app.get("/users")
 def get_users():
     # Mock users
@@ -591,11 +896,75 @@ def get_files():
                 files.append(f)
     return files
 
-from tools import get_data_json
+@app.get("/datasets")
+def get_datasets():
+    """Every dataset name, including each sheet of uploaded workbooks ("book.xlsx:Sheet2")."""
+    import tools
+    tools.refresh_shared_state()
+    return [{"name": name, "loaded": name in tools.dataframes} for name in tools.dataset_names()]
+
+def _encode_cursor(query):
+    return base64.urlsafe_b64encode(serialization.dumps(query).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor):
+    try:
+        query = serialization.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        query = None
+    if not isinstance(query, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return query
+
+from tools import get_data_page
 @app.get("/data/preview")
-def get_data_preview_endpoint(filename: Optional[str] = None):
-    data = get_data_json(filename)
+def get_data_preview_endpoint(
+    filename: Optional[str] = None,
+    format: str = "records",
+    offset: int = 0,
+    limit: int = 10,
+    columns: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+    where: List[str] = Query(default=[]),
+    cursor: Optional[str] = None
+):
+    """
+    A page of a dataset. `columns` is a comma-separated projection, `where`
+    takes column=value equality filters (repeatable), `sort_by`/`descending`
+    sort server-side. Pass `next_cursor` from a response as `cursor` to get
+    the following page of the same query.
+    """
+    if format not in serialization.DATA_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if cursor:
+        query = _decode_cursor(cursor)
+    else:
+        filters = {}
+        for condition in where:
+            column, separator, value = condition.partition("=")
+            if not separator:
+                raise HTTPException(status_code=400, detail=f"Filters are column=value, got: {condition}")
+            filters[column] = value
+        query = {
+            "filename": filename, "offset": offset, "limit": limit,
+            "columns": [c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+            "sort_by": sort_by, "descending": descending, "filters": filters
+        }
+    version = query.pop("version", None)
+    try:
+        data = get_data_page(**query)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if data and version is not None and data["version"] != version:
+        raise HTTPException(status_code=409, detail="The dataset changed since this cursor was issued, start again from the first page")
     if data:
+        next_offset = data["offset"] + data["limit"]
+        data["next_cursor"] = _encode_cursor(
+            dict(query, filename=data["filename"], offset=next_offset, version=data["version"])
+        ) if data["limit"] and next_offset < data["matched_rows"] else None
+        if format == 'columnar':
+            data["data"] = serialization.records_to_columnar(data["data"])
+            data["data_format"] = 'columnar'
         return data
     return {"message": "No data loaded"}
 
@@ -0,0 +1,180 @@
+import os
+import re
+import zlib
+import numpy as np
+
+# Hashed TF-IDF width; vectors are this wide unless LSA reduces them
+HASH_DIM = int(os.getenv("KB_HASH_DIM", "1024"))
+# LSA (truncated SVD) target width, applied once the corpus has LSA_MIN_CHUNKS chunks
+LSA_DIM = int(os.getenv("KB_LSA_DIM", "128"))
+LSA_MIN_CHUNKS = int(os.getenv("KB_LSA_MIN_CHUNKS", "2000"))
+# Cluster-pruned (IVF) search for corpora of at least IVF_MIN_CHUNKS chunks
+IVF_MIN_CHUNKS = int(os.getenv("KB_IVF_MIN_CHUNKS", "20000"))
+IVF_NPROBE = int(os.getenv("KB_IVF_NPROBE", "8"))
+IVF_ITERATIONS = 10
+# Reciprocal rank fusion constant
+RRF_K = 60
+BATCH_ROWS = 4096
+
+_TOKEN = re.compile(r'\w+')
+
+
+def _buckets(text, dim):
+    # crc32 rather than hash(): bucket ids must not change between processes
+    tokens = _TOKEN.findall(text.lower())
+    return np.fromiter((zlib.crc32(token.encode()) % dim for token in tokens), dtype=np.int64, count=len(tokens))
+
+
+def _normalize(rows):
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows / np.maximum(norms, 1e-12)
+
+
+def term_rows(texts, dim=HASH_DIM):
+    """
+    Sparse log(1 + tf) rows of the hashed terms of each text, as CSR arrays
+    (indptr, indices, values). They depend on nothing but the text, so they
+    can be stored per document and combined into an index later.
+    """
+    indptr = np.zeros(len(texts) + 1, dtype=np.int64)
+    indices, values = [], []
+    for i, text in enumerate(texts):
+        buckets, counts = np.unique(_buckets(text, dim), return_counts=True)
+        indices.append(buckets.astype(np.int32))
+        values.append(np.log1p(counts).astype(np.float32))
+        indptr[i + 1] = indptr[i] + len(buckets)
+    if not indices:
+        return indptr, np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    return indptr, np.concatenate(indices), np.concatenate(values)
+
+
+def concat_term_rows(parts):
+    """One set of CSR term rows from several, in order."""
+    parts = list(parts)
+    if not parts:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    indptrs, offset = [np.zeros(1, dtype=np.int64)], 0
+    for indptr, _, _ in parts:
+        indptrs.append(np.asarray(indptr[1:], dtype=np.int64) + offset)
+        offset += int(indptr[-1])
+    return (
+        np.concatenate(indptrs),
+        np.concatenate([np.asarray(indices) for _, indices, _ in parts]),
+        np.concatenate([np.asarray(values) for _, _, values in parts])
+    )
+
+
+class VectorIndex:
+    """
+    Dense retrieval index over a list of texts, without any network or model download.
+
+    Texts become hashed TF-IDF vectors (sublinear tf), optionally reduced by LSA,
+    stored L2-normalized in one float32 matrix so cosine similarity is a matrix
+    product. Large corpora additionally get an IVF index: spherical k-means
+    clusters, of which only the IVF_NPROBE closest are scored per query.
+    Pass `terms` (see term_rows) instead of texts to skip tokenizing.
+    """
+
+    def __init__(self, texts=None, dim=HASH_DIM, lsa_dim=LSA_DIM, seed=0, terms=None):
+        self.dim = dim
+        if terms is None:
+            terms = term_rows(texts, dim)
+        indptr, indices, values = terms
+        n = len(indptr) - 1
+
+        doc_freq = np.bincount(indices, minlength=dim).astype(np.float64)
+        self.idf = (np.log((1 + n) / (1 + doc_freq)) + 1).astype(np.float32)
+
+        self.projection = None
+        if n >= LSA_MIN_CHUNKS and lsa_dim < dim:
+            # Right singular vectors of the TF-IDF matrix, accumulated batch by batch as A^T A
+            gram = np.zeros((dim, dim), dtype=np.float64)
+            for start in range(0, n, BATCH_ROWS):
+                rows = _normalize(self._tfidf(terms, start, min(start + BATCH_ROWS, n)))
+                gram += rows.T.astype(np.float64) @ rows
+            _, eigenvectors = np.linalg.eigh(gram)
+            self.projection = np.ascontiguousarray(eigenvectors[:, ::-1][:, :lsa_dim], dtype=np.float32)
+
+        width = self.projection.shape[1] if self.projection is not None else dim
+        self.vectors = np.zeros((n, width), dtype=np.float32)
+        for start in range(0, n, BATCH_ROWS):
+            self.vectors[start:start + BATCH_ROWS] = self._embed(terms, start, min(start + BATCH_ROWS, n))
+
+        self.centroids = None
+        if n >= IVF_MIN_CHUNKS:
+            self._build_ivf(seed)
+
+    def _tfidf(self, terms, start, stop):
+        indptr, indices, values = terms
+        rows = np.zeros((stop - start, self.dim), dtype=np.float32)
+        first, last = indptr[start], indptr[stop]
+        row_ids = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+        # Buckets are unique within a row, so plain assignment is enough
+        rows[row_ids, indices[first:last]] = values[first:last]
+        rows *= self.idf
+        return rows
+
+    def _embed(self, terms, start, stop):
+        rows = _normalize(self._tfidf(terms, start, stop))
+        if self.projection is not None:
+            rows = _normalize(rows @ self.projection)
+        return rows.astype(np.float32, copy=False)
+
+    def _build_ivf(self, seed):
+        n = len(self.vectors)
+        n_lists = max(int(np.sqrt(n)), 1)
+        rng = np.random.default_rng(seed)
+        centroids = self.vectors[rng.choice(n, n_lists, replace=False)].copy()
+        for _ in range(IVF_ITERATIONS):
+            assignment = self._assign(centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, self.vectors)
+            filled = np.bincount(assignment, minlength=n_lists) > 0
+            centroids[filled] = _normalize(sums[filled])
+        assignment = self._assign(centroids)
+        self.centroids = centroids
+        # Members of list c are order[offsets[c]:offsets[c + 1]]
+        self.order = np.argsort(assignment, kind='stable')
+        self.offsets = np.searchsorted(assignment[self.order], np.arange(n_lists + 1))
+
+    def _assign(self, centroids):
+        assignment = np.empty(len(self.vectors), dtype=np.int64)
+        for start in range(0, len(self.vectors), BATCH_ROWS):
+            assignment[start:start + BATCH_ROWS] = np.argmax(self.vectors[start:start + BATCH_ROWS] @ centroids.T, axis=1)
+        return assignment
+
+    def search(self, queries, k=5, nprobe=IVF_NPROBE):
+        """Top-k (index, cosine) pairs for each query, best first."""
+        if not len(self.vectors):
+            return [[] for _ in queries]
+        query_vectors = self._embed(term_rows(queries, self.dim), 0, len(queries))
+
+        if self.centroids is None:
+            # Batched exact cosine: one matrix product for all queries
+            scores = self.vectors @ query_vectors.T
+            return [_top_k(np.arange(len(self.vectors)), scores[:, i], k) for i in range(len(queries))]
+
+        results = []
+        probes = np.argsort(-(query_vectors @ self.centroids.T), axis=1)[:, :nprobe]
+        for query_vector, lists in zip(query_vectors, probes):
+            candidates = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+            results.append(_top_k(candidates, self.vectors[candidates] @ query_vector, k))
+        return results
+
+
+def _top_k(candidates, scores, k):
+    if len(scores) > k:
+        best = np.argpartition(-scores, k)[:k]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best])]
+    return [(int(candidates[i]), float(scores[i])) for i in best]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse several best-first lists of item ids into one best-first list of (id, score)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda entry: entry[1], reverse=True)
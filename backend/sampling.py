@@ -0,0 +1,151 @@
+import os
+import threading
+import telemetry
+import numpy as np
+import pandas as pd
+
+# Datasets smaller than this are always aggregated exactly
+APPROX_MIN_ROWS = int(os.getenv("APPROX_MIN_ROWS", "1000000"))
+# Target size of a maintained stratified sample
+APPROX_SAMPLE_ROWS = int(os.getenv("APPROX_SAMPLE_ROWS", "100000"))
+# Every stratum keeps at least this many rows so small groups stay measurable
+APPROX_MIN_PER_STRATUM = int(os.getenv("APPROX_MIN_PER_STRATUM", "200"))
+# Two-sided 95% normal quantile
+Z_95 = 1.959963984540054
+
+# min/max cannot be estimated from a sample, they always run exactly
+SUPPORTED_AGGREGATIONS = ('count', 'sum', 'mean', 'median')
+
+WEIGHT_COLUMN = "__weight__"
+STRATUM_ROWS_COLUMN = "__stratum_rows__"
+
+# Key: (filename, strata column), Value: (dataset version, sample DataFrame)
+_samples = {}
+_samples_lock = threading.Lock()
+
+
+def stratified_sample(df, column, target_rows=APPROX_SAMPLE_ROWS, min_per_stratum=APPROX_MIN_PER_STRATUM, seed=0):
+    """
+    Draw a stratified sample of `df` on `column`.
+
+    Each stratum is sampled proportionally to its size, but never below
+    `min_per_stratum` rows (or the whole stratum if it is smaller). Every
+    sampled row carries its inverse inclusion probability in WEIGHT_COLUMN
+    and the stratum population in STRATUM_ROWS_COLUMN.
+    """
+    codes, uniques = pd.factorize(df[column])
+    valid_idx = np.flatnonzero(codes >= 0)
+    valid_codes = codes[valid_idx]
+
+    sizes = np.bincount(valid_codes, minlength=len(uniques))
+    fraction = min(1.0, target_rows / max(len(valid_idx), 1))
+    take = np.minimum(sizes, np.maximum(np.ceil(sizes * fraction), min_per_stratum)).astype(np.int64)
+
+    # Shuffle rows inside each stratum and keep the first `take` of each
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((rng.random(len(valid_idx)), valid_codes))
+    sorted_codes = valid_codes[order]
+    starts = np.cumsum(sizes) - sizes
+    rank = np.arange(len(order)) - starts[sorted_codes]
+    selected = rank < take[sorted_codes]
+
+    rows = np.sort(valid_idx[order[selected]])
+    row_codes = codes[rows]
+    sample = df.iloc[rows].copy()
+    sample[WEIGHT_COLUMN] = (sizes / np.maximum(take, 1))[row_codes]
+    sample[STRATUM_ROWS_COLUMN] = sizes[row_codes]
+    return sample
+
+
+def get_sample(filename, df, version, column):
+    """Return the maintained stratified sample for (filename, column), rebuilding it when the dataset changed."""
+    key = (filename, column)
+    with _samples_lock:
+        cached = _samples.get(key)
+    hit = cached is not None and cached[0] == version
+    telemetry.cache_event("sample", hit)
+    if hit:
+        return cached[1]
+
+    sample = stratified_sample(df, column)
+    with _samples_lock:
+        _samples[key] = (version, sample)
+    print(f"[SAMPLE] Built stratified sample of {len(sample)}/{len(df)} rows for {filename} on '{column}'")
+    return sample
+
+
+def invalidate(filename):
+    """Drop every maintained sample of `filename`."""
+    with _samples_lock:
+        for key in [k for k in _samples if k[0] == filename]:
+            del _samples[key]
+
+
+def _median_bounds(values, z=Z_95):
+    """Sample median with a distribution-free order-statistic confidence interval."""
+    values = np.sort(values)
+    m = len(values)
+    half_width = z * np.sqrt(m) / 2
+    low = int(max(np.floor(m / 2 - half_width), 0))
+    high = int(min(np.ceil(m / 2 + half_width), m - 1))
+    return float(np.median(values)), float(values[low]), float(values[high])
+
+
+def approximate_aggregate(sample, group_column, value_column, aggregation, value_name,
+                          filter_column=None, filter_value=None, z=Z_95):
+    """
+    Estimate `aggregation` of `value_column` per `group_column` from a sample
+    stratified on `group_column`.
+
+    Returns a DataFrame with the group column, the estimate under `value_name`
+    and its confidence interval in `<value_name>_ci_low` / `<value_name>_ci_high`.
+    """
+    # Stratum sample sizes are needed before filtering for domain estimators
+    stratum_sample_rows = sample.groupby(group_column).size()
+
+    if filter_column and filter_value:
+        sample = sample[sample[filter_column] == filter_value]
+
+    grouped = sample.groupby(group_column)
+    population = grouped[STRATUM_ROWS_COLUMN].first()
+    n = stratum_sample_rows.reindex(population.index).astype(float)
+    fpc = np.clip(1 - n / population, 0, 1)
+
+    if aggregation in ('count', 'sum'):
+        # Horvitz-Thompson total over the stratum; rows outside the filter contribute z=0
+        if aggregation == 'count':
+            z_sum = grouped.size().astype(float)
+            z_sq_sum = z_sum
+        else:
+            y = sample[value_column].fillna(0)
+            z_sum = y.groupby(sample[group_column]).sum()
+            z_sq_sum = (y * y).groupby(sample[group_column]).sum()
+        estimate = population / n * z_sum
+        variance = (z_sq_sum - z_sum ** 2 / n) / np.maximum(n - 1, 1)
+        error = z * population * np.sqrt(fpc / n * variance.clip(lower=0))
+        low, high = estimate - error, estimate + error
+    elif aggregation == 'mean':
+        estimate = grouped[value_column].mean()
+        count = grouped[value_column].count()
+        error = z * grouped[value_column].std().fillna(0) / np.sqrt(count.clip(lower=1)) * np.sqrt(fpc)
+        low, high = estimate - error, estimate + error
+    elif aggregation == 'median':
+        bounds = {
+            key: _median_bounds(group[value_column].dropna().to_numpy(), z)
+            for key, group in grouped
+            if group[value_column].notna().any()
+        }
+        index = pd.Index(list(bounds.keys()), name=group_column)
+        estimate = pd.Series([b[0] for b in bounds.values()], index=index)
+        low = pd.Series([b[1] for b in bounds.values()], index=index)
+        high = pd.Series([b[2] for b in bounds.values()], index=index)
+    else:
+        raise ValueError(f"Aggregation '{aggregation}' is not supported in approximate mode")
+
+    result = pd.DataFrame({
+        value_name: estimate,
+        f"{value_name}_ci_low": low,
+        f"{value_name}_ci_high": high,
+    })
+    result.index.name = group_column
+    return result.reset_index()
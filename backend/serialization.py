@@ -0,0 +1,74 @@
+import json
+import math
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Chart payload layouts accepted by /chat and /data/preview
+DATA_FORMATS = ('records', 'columnar')
+
+
+def _finite(obj):
+    # NaN and infinity are not JSON; orjson writes them as null, the stdlib fallback does the same through this
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+def _default(obj):
+    if isinstance(obj, np.generic):
+        return _finite(obj.item())
+    if isinstance(obj, np.ndarray):
+        return _finite(obj.tolist())
+    if isinstance(obj, (pd.Timestamp, pd.Timedelta)):
+        return obj.isoformat()
+    if obj is pd.NaT:
+        return None
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Serialize to a JSON string, using orjson (with numpy support) when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(_finite(obj), default=_default, allow_nan=False)
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def records_to_columnar(records):
+    columns = {}
+    for key in (records[0].keys() if records else []):
+        columns[key] = [row.get(key) for row in records]
+    return columns
+
+
+def chart_to_format(chart_config, data_format='records'):
+    """Return `chart_config` with its data in the requested layout; records stay untouched."""
+    if data_format != 'columnar' or chart_config.get("data_format") == 'columnar':
+        return chart_config
+    converted = dict(chart_config)
+    converted["data"] = records_to_columnar(chart_config.get("data") or [])
+    converted["data_format"] = 'columnar'
+    return converted
+
+
+def embed(obj, **raw_json):
+    """Serialize the dict `obj` and splice already-encoded JSON strings in as extra members."""
+    body = dumps(obj)
+    members = ",".join(f"{dumps(key)}:{value}" for key, value in raw_json.items())
+    if not members:
+        return body
+    return body[:-1] + ("," if obj else "") + members + "}"
@@ -0,0 +1,121 @@
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+import serialization
+
+# Histogram bucket upper bounds in seconds, from a cached aggregation up to a slow completion
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+# Key: stage, Value: [count per bucket..., count above the last bucket, sum, count]
+_stage_histograms = {}
+# Key: (cache, 'hit' or 'miss'), Value: int
+_cache_events = {}
+# Spans of the request being handled, a list shared by everything running on its behalf
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+def observe(stage, seconds):
+    with _lock:
+        histogram = _stage_histograms.get(stage)
+        if histogram is None:
+            histogram = _stage_histograms[stage] = [0] * (len(STAGE_BUCKETS) + 3)
+        histogram[bisect.bisect_left(STAGE_BUCKETS, seconds)] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def cache_event(cache, hit):
+    key = (cache, "hit" if hit else "miss")
+    with _lock:
+        _cache_events[key] = _cache_events.get(key, 0) + 1
+
+
+@contextmanager
+def span(stage, **attributes):
+    """Time the block into the `stage` histogram and, inside a trace, record it as a span."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record(stage, start, error=error, **attributes)
+
+
+def record(stage, start, **attributes):
+    """Record a stage that began at time.perf_counter() `start` and ends now."""
+    seconds = time.perf_counter() - start
+    observe(stage, seconds)
+    spans = _current_trace.get()
+    if spans is not None:
+        entry = {"stage": stage, "start_ms": round((start - spans[0]) * 1000, 2), "ms": round(seconds * 1000, 2)}
+        entry.update((key, value) for key, value in attributes.items() if value is not None)
+        spans[1].append(entry)
+
+
+@contextmanager
+def trace(name):
+    """Collect the spans of one request and print them as a single [TRACE] line when it ends."""
+    trace_id = uuid.uuid4().hex[:16]
+    spans = (time.perf_counter(), [])
+    token = _current_trace.set(spans)
+    try:
+        with span(name):
+            yield trace_id
+    finally:
+        _current_trace.reset(token)
+        print(f"[TRACE] {name} {trace_id} {serialization.dumps(spans[1])}")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def format_metric(name, kind, help_text, samples):
+    """Prometheus text-format lines for one metric; `samples` is [(labels dict, value)]."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in samples)
+    return lines
+
+
+def render():
+    """Stage histograms and cache counters in the Prometheus text format."""
+    with _lock:
+        histograms = {stage: list(values) for stage, values in _stage_histograms.items()}
+        cache_events = dict(_cache_events)
+
+    name = "chat_stage_duration_seconds"
+    lines = [f"# HELP {name} Time spent per request stage", f"# TYPE {name} histogram"]
+    for stage, values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(STAGE_BUCKETS, values):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({'stage': stage, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_bucket{_labels({'stage': stage, 'le': '+Inf'})} {values[-1]}")
+        lines.append(f"{name}_sum{_labels({'stage': stage})} {values[-2]}")
+        lines.append(f"{name}_count{_labels({'stage': stage})} {values[-1]}")
+
+    lines += format_metric(
+        "cache_requests_total", "counter", "Cache lookups by cache and result",
+        [({"cache": cache, "result": result}, count) for (cache, result), count in sorted(cache_events.items())]
+    )
+    caches = sorted({cache for cache, _ in cache_events})
+    ratios = []
+    for cache in caches:
+        hits, misses = cache_events.get((cache, "hit"), 0), cache_events.get((cache, "miss"), 0)
+        ratios.append(({"cache": cache}, round(hits / (hits + misses), 4)))
+    lines += format_metric("cache_hit_ratio", "gauge", "Share of cache lookups that hit", ratios)
+    return lines
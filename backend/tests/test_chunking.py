@@ -0,0 +1,31 @@
+import numpy as np
+
+from chunking import split_text, near_duplicates
+
+
+def paragraph(seed, words=120):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return " ".join(rng.choice(vocabulary, words))
+
+
+def test_near_duplicates_marks_later_copies_only():
+    base = paragraph(0)
+    edited = base.replace(base.split()[60], "changed", 1)
+    texts = [base, paragraph(1), base, edited, paragraph(2)]
+
+    assert near_duplicates(texts).tolist() == [False, False, True, True, False]
+
+
+def test_distinct_texts_are_kept():
+    texts = [paragraph(seed) for seed in range(50)]
+    assert not near_duplicates(texts).any()
+
+
+def test_windows_are_bounded_and_overlap():
+    text = " ".join(paragraph(seed) for seed in range(10))
+    windows = split_text(text, max_chars=500, overlap=100)
+
+    assert all(len(window) <= 500 for window in windows)
+    for previous, current in zip(windows, windows[1:]):
+        assert current.split()[0] in previous
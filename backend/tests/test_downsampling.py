@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from downsampling import lttb_indices, density_sample_indices, reduce_for_chart
+
+
+def test_lttb_keeps_endpoints_and_budget():
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 300)
+    indices = lttb_indices(x, y, 200)
+
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert len(indices) <= 200
+    assert (np.diff(indices) > 0).all()
+
+
+def test_lttb_keeps_isolated_spikes():
+    x = np.arange(5000, dtype=float)
+    y = np.zeros(5000)
+    y[1234], y[4321] = 100.0, -100.0
+    indices = lttb_indices(x, y, 50)
+
+    assert 1234 in indices and 4321 in indices
+
+
+def test_lttb_leaves_short_series_alone():
+    x = np.arange(10, dtype=float)
+    np.testing.assert_array_equal(lttb_indices(x, x, 50), np.arange(10))
+
+
+def test_density_sample_keeps_outliers_and_budget():
+    rng = np.random.default_rng(0)
+    x = np.append(rng.normal(0, 1, 20000), 50.0)
+    y = np.append(rng.normal(0, 1, 20000), 50.0)
+    indices = density_sample_indices(x, y, 400)
+
+    assert len(indices) == 400
+    assert len(np.unique(indices)) == 400
+    assert len(x) - 1 in indices
+
+
+def test_reduce_for_chart_projects_line_data_onto_plotted_columns():
+    data = pd.DataFrame({"t": np.arange(2000), "v": np.random.default_rng(0).normal(size=2000), "other": "x"})
+    reduced = reduce_for_chart(data, "line", "t", "v", max_points=100)
+
+    assert list(reduced.columns) == ["t", "v"]
+    assert len(reduced) <= 100
+    assert reduced["t"].iloc[0] == 0 and reduced["t"].iloc[-1] == 1999
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from incremental import DECOMPOSABLE, GroupedAggregate, DatasetProfile
+
+
+def frame(rows, seed, groups="abcde"):
+    rng = np.random.default_rng(seed)
+    value = rng.integers(-50, 50, rows).astype(float) / 2
+    value[rng.random(rows) < 0.1] = np.nan
+    return pd.DataFrame({
+        "group": rng.choice(list(groups), rows),
+        "value": value,
+        "count": rng.integers(0, 10, rows),
+        "label": rng.choice(["x", "y", "z"], rows)
+    })
+
+
+@pytest.fixture
+def parts():
+    # The second part adds a group the first has never seen
+    return frame(300, 1), frame(200, 2, groups="cdef")
+
+
+def test_merged_aggregate_equals_aggregate_of_concatenation(parts):
+    first, second = parts
+    combined = pd.concat([first, second], ignore_index=True)
+    merged = GroupedAggregate.from_frame(first, "group", "value").merge(GroupedAggregate.from_frame(second, "group", "value"))
+
+    for aggregation in DECOMPOSABLE:
+        expected = combined.groupby("group")["value"].agg(aggregation)
+        pd.testing.assert_series_equal(merged.result(aggregation), expected, check_dtype=False)
+
+
+def test_merged_row_counts_equal_group_sizes_of_concatenation(parts):
+    first, second = parts
+    combined = pd.concat([first, second], ignore_index=True)
+    merged = GroupedAggregate.from_frame(first, "group").merge(GroupedAggregate.from_frame(second, "group"))
+
+    expected = combined.groupby("group").size()
+    pd.testing.assert_series_equal(merged.result("count"), expected, check_dtype=False, check_names=False)
+
+
+def test_merge_keeps_groups_whose_new_values_are_all_null():
+    first = pd.DataFrame({"group": ["a", "b"], "value": [1.0, 2.0]})
+    second = pd.DataFrame({"group": ["b", "c"], "value": [np.nan, np.nan]})
+    combined = pd.concat([first, second], ignore_index=True)
+    merged = GroupedAggregate.from_frame(first, "group", "value").merge(GroupedAggregate.from_frame(second, "group", "value"))
+
+    for aggregation in ("count", "min", "max"):
+        expected = combined.groupby("group")["value"].agg(aggregation)
+        pd.testing.assert_series_equal(merged.result(aggregation), expected, check_dtype=False)
+
+
+def test_updated_profile_equals_profile_of_concatenation(parts):
+    first, second = parts
+    combined = pd.concat([first, second], ignore_index=True)
+    profile = DatasetProfile(first)
+    profile.update(second, combined.dtypes)
+
+    assert profile.text() == DatasetProfile(combined).text()
+    assert profile.rows == len(combined)
+
+
+def test_profile_update_rejects_changed_schema(parts):
+    first, second = parts
+    profile = DatasetProfile(first)
+
+    with pytest.raises(ValueError):
+        profile.update(second.drop(columns="label"), second.drop(columns="label").dtypes)
+    relabelled = second.assign(count=second["count"].astype(str))
+    with pytest.raises(ValueError):
+        profile.update(relabelled, relabelled.dtypes)
@@ -0,0 +1,178 @@
+import time
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("fastapi")
+import llm_gateway
+from llm_gateway import LLMGateway, DeadlineExceeded, ROLE_PRIORITY
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        self.response = type("Response", (), {"headers": {"retry-after": retry_after} if retry_after else {}})()
+
+
+class FakeClient:
+    """Stands in for an OpenAI client: each call to chat.completions.create runs the next step."""
+
+    def __init__(self, *steps):
+        self.steps = list(steps)
+        self.calls = []
+        self.release = threading.Event()
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        step = self.steps.pop(0) if self.steps else "ok"
+        if step == "block":
+            # Blocks the worker thread like a slow server until the test releases it
+            self.release.wait(5)
+            return "late"
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def gateway(client, **kwargs):
+    kwargs.setdefault("rate", 1000)
+    kwargs.setdefault("burst", 1000)
+    return LLMGateway(client, **kwargs)
+
+
+def test_admin_requests_are_admitted_before_queued_user_requests():
+    client = FakeClient("block")
+    llm = gateway(client, max_concurrency=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(llm.create(model="first"))
+        await asyncio.sleep(0.05)
+        user = asyncio.ensure_future(llm.create(priority=ROLE_PRIORITY["user"], model="user"))
+        await asyncio.sleep(0.01)
+        admin = asyncio.ensure_future(llm.create(priority=ROLE_PRIORITY["admin"], model="admin"))
+        await asyncio.sleep(0.01)
+        assert llm.queue_depth == 2
+        client.release.set()
+        await asyncio.gather(first, user, admin)
+
+    run(scenario())
+    assert [call["model"] for call in client.calls] == ["first", "admin", "user"]
+    assert llm.metrics()["in_flight"] == 0
+
+
+def test_rate_limited_calls_are_retried_after_retry_after():
+    client = FakeClient(RateLimited("0.05"), RateLimited("0.05"), "answer")
+    llm = gateway(client, max_retries=3)
+
+    started = time.monotonic()
+    assert run(llm.create()) == "answer"
+    assert time.monotonic() - started >= 0.1
+    assert (llm.retries, llm.rate_limited, len(client.calls)) == (2, 2, 3)
+
+
+def test_backoff_without_retry_after_is_bounded_by_the_exponential_cap(monkeypatch):
+    delays = []
+    monkeypatch.setattr(llm_gateway, "LLM_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(llm_gateway.random, "uniform", lambda low, high: delays.append(high) or 0.0)
+    client = FakeClient(RateLimited(), RateLimited(), RateLimited(), "answer")
+
+    assert run(gateway(client, max_retries=3).create()) == "answer"
+    assert delays == [0.01, 0.02, 0.04]
+
+
+def test_rate_limit_error_is_raised_once_retries_run_out():
+    client = FakeClient(*[RateLimited("0.01")] * 3)
+    llm = gateway(client, max_retries=2)
+
+    with pytest.raises(RateLimited):
+        run(llm.create())
+    assert (llm.retries, llm.rate_limited, len(client.calls)) == (2, 3, 3)
+
+
+def test_other_errors_are_not_retried():
+    client = FakeClient(ValueError("bad request"), "answer")
+    llm = gateway(client)
+
+    with pytest.raises(ValueError):
+        run(llm.create())
+    assert (llm.retries, len(client.calls)) == (0, 1)
+
+
+def test_slow_attempt_is_hedged_and_the_first_answer_wins():
+    client = FakeClient("block", "hedged answer")
+    llm = gateway(client, hedge_delay=0.05)
+    try:
+        assert run(llm.create()) == "hedged answer"
+    finally:
+        client.release.set()
+    assert (llm.hedged, llm.hedge_wins, len(client.calls)) == (1, 1, 2)
+
+
+def test_fast_attempt_is_not_hedged():
+    client = FakeClient("answer")
+    llm = gateway(client, hedge_delay=0.5)
+
+    assert run(llm.create()) == "answer"
+    assert (llm.hedged, len(client.calls)) == (0, 1)
+
+
+def test_deadline_expires_while_queued():
+    client = FakeClient("block")
+    llm = gateway(client, max_concurrency=1)
+
+    async def scenario():
+        first = asyncio.ensure_future(llm.create())
+        await asyncio.sleep(0.05)
+        with pytest.raises(DeadlineExceeded):
+            await llm.create(deadline=time.monotonic() + 0.05)
+        assert llm.queue_depth == 0
+        client.release.set()
+        await first
+
+    run(scenario())
+    assert llm.deadline_exceeded == 1
+    assert len(client.calls) == 1
+
+
+def test_deadline_expires_during_a_slow_call():
+    client = FakeClient("block")
+    llm = gateway(client)
+    try:
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            run(llm.create(deadline=time.monotonic() + 0.1))
+        assert time.monotonic() - started < 1
+    finally:
+        client.release.set()
+    assert client.calls[0]["timeout"] <= 0.1
+    assert llm.deadline_exceeded == 1
+    assert llm.metrics()["in_flight"] == 0
+
+
+def test_deadline_shorter_than_the_rate_limit_fails_at_once():
+    client = FakeClient("answer")
+    llm = gateway(client, rate=0.1, burst=1)
+    assert run(llm.create()) == "answer"
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        run(llm.create(deadline=time.monotonic() + 1))
+    assert time.monotonic() - started < 0.5
+    assert len(client.calls) == 1
+
+
+def test_retry_after_beyond_the_deadline_is_not_waited_for():
+    client = FakeClient(RateLimited("30"), "answer")
+    llm = gateway(client)
+
+    with pytest.raises(RateLimited):
+        run(llm.create(deadline=time.monotonic() + 1))
+    assert (llm.retries, len(client.calls)) == (0, 1)
@@ -0,0 +1,48 @@
+import numpy as np
+
+import retrieval
+from retrieval import VectorIndex, term_rows, concat_term_rows, reciprocal_rank_fusion
+
+
+def corpus(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    return [" ".join(rng.choice(vocabulary, 40)) for _ in range(rows)]
+
+
+def test_exact_search_finds_the_queried_text():
+    texts = corpus(300)
+    index = VectorIndex(texts)
+
+    assert index.centroids is None
+    for i, hits in zip(range(0, 300, 37), index.search(texts[0:300:37], k=3)):
+        assert hits[0][0] == i
+        assert abs(hits[0][1] - 1) < 1e-5
+
+
+def test_ivf_search_matches_exact_search(monkeypatch):
+    texts = corpus(2000)
+    exact = VectorIndex(texts)
+    monkeypatch.setattr(retrieval, "IVF_MIN_CHUNKS", 1000)
+    ivf = VectorIndex(texts)
+    assert ivf.centroids is not None
+
+    queries = texts[:50]
+    # Probing every list is exhaustive
+    all_lists = ivf.search(queries, k=5, nprobe=len(ivf.centroids))
+    assert [[i for i, _ in hits] for hits in all_lists] == [[i for i, _ in hits] for hits in exact.search(queries, k=5)]
+    # The default probes still find the queried text itself
+    assert [hits[0][0] for hits in ivf.search(queries, k=1)] == list(range(50))
+
+
+def test_index_from_stored_term_rows_equals_index_from_texts():
+    texts = corpus(100)
+    parts = [term_rows(texts[:40]), term_rows(texts[40:])]
+    from_terms = VectorIndex(terms=concat_term_rows(parts))
+
+    np.testing.assert_allclose(from_terms.vectors, VectorIndex(texts).vectors)
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [2, 3, 1], [2, 1]])
+    assert [item for item, _ in fused][:2] == [2, 1]
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from sampling import stratified_sample, approximate_aggregate, WEIGHT_COLUMN, STRATUM_ROWS_COLUMN
+
+
+def population(rows=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    # One large, one medium and one tiny stratum
+    group = rng.choice(["big", "mid", "tiny"], rows, p=[0.85, 0.149, 0.001])
+    return pd.DataFrame({"group": group, "value": rng.gamma(2.0, 10.0, rows), "flag": rng.choice(["on", "off"], rows)})
+
+
+def test_sample_weights_add_up_to_stratum_sizes():
+    df = population()
+    sample = stratified_sample(df, "group", target_rows=1000, min_per_stratum=50)
+    sizes = df["group"].value_counts()
+
+    weights = sample.groupby("group")[WEIGHT_COLUMN].sum()
+    np.testing.assert_allclose(weights.sort_index(), sizes.sort_index())
+    assert (sample.groupby("group")[STRATUM_ROWS_COLUMN].first() == sizes).all()
+    # Small strata keep min_per_stratum rows, or all of them
+    taken = sample["group"].value_counts()
+    assert taken["tiny"] == sizes["tiny"]
+    assert taken["mid"] >= 50
+
+
+def test_full_sample_gives_exact_estimates_with_zero_width_intervals():
+    df = population(2000)
+    sample = stratified_sample(df, "group", target_rows=len(df))
+
+    for aggregation in ("count", "sum", "mean"):
+        result = approximate_aggregate(sample, "group", "value", aggregation, "v").set_index("group")
+        expected = df.groupby("group")["value"].agg(aggregation if aggregation != "count" else "size")
+        np.testing.assert_allclose(result["v"], expected.reindex(result.index))
+        np.testing.assert_allclose(result["v_ci_low"], result["v"])
+        np.testing.assert_allclose(result["v_ci_high"], result["v"])
+
+
+def test_intervals_cover_the_true_values_in_most_samples():
+    df = population()
+    truth = {
+        "sum": df.groupby("group")["value"].sum(),
+        "mean": df.groupby("group")["value"].mean(),
+        "median": df.groupby("group")["value"].median(),
+        "count": df[df["flag"] == "on"].groupby("group").size()
+    }
+    covered = {aggregation: [] for aggregation in truth}
+    for seed in range(40):
+        sample = stratified_sample(df, "group", target_rows=1000, min_per_stratum=50, seed=seed)
+        for aggregation, expected in truth.items():
+            filters = ("flag", "on") if aggregation == "count" else (None, None)
+            result = approximate_aggregate(sample, "group", "value", aggregation, "v", *filters).set_index("group")
+            low, high = result.loc["big", ["v_ci_low", "v_ci_high"]]
+            covered[aggregation].append(low <= expected["big"] <= high)
+    for aggregation, hits in covered.items():
+        # Nominal 95%; allow for 40 draws
+        assert np.mean(hits) >= 0.85, aggregation
@@ -1,39 +1,320 @@
 import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import seaborn as sns
+import numpy as np
 import json
 import os
 import uuid
-import pypdf
 import re
+import sys
+import threading
+import itertools
+from collections import OrderedDict
+import sampling
+import downsampling
+import serialization
+import kbstore
+import chunking
+import retrieval
+import importcost
+import singleflight
+import telemetry
+import workbooks
+import incremental
+import jobs
 
 STATIC_DIR = "static/charts"
 os.makedirs(STATIC_DIR, exist_ok=True)
 
+# Limits for tool results sent back to the LLM
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "4000"))
+TOOL_SUMMARY_TOP_CATEGORIES = 5
+
+# Knowledge base retrieval: 'keyword', 'vector' or 'hybrid'
+KB_RETRIEVAL_MODE = os.getenv("KB_RETRIEVAL_MODE", "keyword")
+# Vector hits considered before fusion with keyword ranking
+KB_VECTOR_CANDIDATES = 50
+
+# Data preview pages: largest page, and memory for cached sorted/filtered row orders (4 bytes per row each)
+PREVIEW_MAX_ROWS = 500
+PREVIEW_ORDERS_MAX_MB = float(os.getenv("PREVIEW_ORDERS_MAX_MB", "256"))
+# Finished chart results kept for repeated identical requests
+RESULT_CACHE_ENTRIES = int(os.getenv("RESULT_CACHE_ENTRIES", "256"))
+
+# Exact versions of approximate charts run as background jobs behind user-submitted ones
+EXACT_JOB_PRIORITY = 2
+
+# Rendered chart images: default format and resolution, and the panel grid of dashboard images
+IMAGE_FORMATS = ('png', 'jpg', 'svg')
+CHART_IMAGE_FORMAT = os.getenv("CHART_IMAGE_FORMAT", "png")
+CHART_IMAGE_DPI = int(os.getenv("CHART_IMAGE_DPI", "100"))
+CHART_IMAGE_DPI_RANGE = (50, 300)
+PANEL_SIZE = (10, 6)
+DASHBOARD_IMAGE_COLUMNS = 2
+
+# Opt-in cross-process store so every uvicorn worker sees every upload
+SHARED_DATASET_STORE = os.getenv("SHARED_DATASET_STORE", "0") == "1"
+
 # Global dictionary to hold loaded dataframes
 # Key: filename, Value: DataFrame
-dataframes = {}
+# With SHARED_DATASET_STORE this is a datastore.SharedDatasetStore backed by memory-mapped Arrow files
+if SHARED_DATASET_STORE:
+    import datastore
+    dataframes = datastore.SharedDatasetStore()
+else:
+    dataframes = {}
 # Global list to hold text chunks for RAG
-# Each item: {"text": str, "source": str, "page": int}
+# Each item: {"text": str, "source": str, "page": int, "doc_hash": str}
 knowledge_base = []
+# Extracted chunks persisted by document hash, so restarts skip PDF parsing
+kb_store = kbstore.KnowledgeBaseStore()
+# Hashed term rows of each document's chunks, persisted in kb_store next to them
+# Key: document hash, Value: (indptr, indices, values) CSR arrays, see retrieval.term_rows
+_kb_terms = {}
+# Bumped whenever knowledge_base changes, so derived indexes know to rebuild
+_kb_version = 0
+# (knowledge base version, retrieval.VectorIndex), built on the first vector query
+_vector_index = None
+# Guards knowledge_base, _kb_terms, _kb_version and _vector_index; readers work on snapshots
+_kb_lock = threading.Lock()
 active_file = None
+# Key: filename, Value: int bumped every time the file is (re)loaded
+dataset_versions = {}
+_versions_lock = threading.Lock()
+# Exact chart results computed in the background for approximate requests
+# Key: (filename, dataset version, spec), Value: chart config dict
+_exact_results = {}
+_exact_pending = set()
+_exact_lock = threading.Lock()
+# Identical chart requests running at the same time share one computation
+_inflight = singleflight.SingleFlight()
+# Finished chart configs and PNG links, least recently used first
+# Key: the _coalesce key (kind, filename, dataset version, params), Value: tool result
+_results = OrderedDict()
+_results_lock = threading.Lock()
+# Rendering shares the themed rcParams and one reusable figure, so it is serialized across threads
+_render_lock = threading.Lock()
+# Single-panel figure cleared and redrawn for every image, guarded by _render_lock
+_panel_figure = None
+# Column statistics behind get_data_summary, updated in place on append
+# Key: filename, Value: (dataset version, incremental.DatasetProfile)
+_profiles = {}
+# Group-by and value-count state of exact charts, updated in place on append
+# Key: (filename, group column, value column, filter column, filter value), Value: (dataset version, incremental.GroupedAggregate)
+_aggregates = {}
+# Guards _profiles and _aggregates; profiles and aggregates are built outside it
+_derived_lock = threading.Lock()
+# Source file of each dataset loaded from CSV, which appends extend
+# Key: filename, Value: path
+_dataset_sources = {}
+# Workbook sheets listed at upload but not parsed until first used
+# Key: dataset name, Value: (workbook path, sheet name, row count or None)
+_pending_sheets = {}
+_sheets_lock = threading.Lock()
+# Row positions of sorted and/or filtered previews, least recently used first
+# Key: (filename, dataset version, sort column, descending, filters), Value: numpy array of row positions
+_row_orders = OrderedDict()
+_row_orders_bytes = 0
+_row_orders_lock = threading.Lock()
+# Memory footprint per file, for /metrics
+# Key: filename, Value: (dataset version, rows, bytes)
+_memory_usage = {}
+# Shared-store document versions already extracted into this process's knowledge_base
+# Key: filename, Value: version
+_document_versions = {}
+
+def _invalidate_derived(filename):
+    global _row_orders_bytes
+    sampling.invalidate(filename)
+    with _derived_lock:
+        _profiles.pop(filename, None)
+        for key in [k for k in _aggregates if k[0] == filename]:
+            del _aggregates[key]
+    with _row_orders_lock:
+        for key in [k for k in _row_orders if k[0] == filename]:
+            _row_orders_bytes -= _row_orders.pop(key).nbytes
+    with _results_lock:
+        for key in [k for k in _results if k[1] == filename]:
+            del _results[key]
+    with _exact_lock:
+        for key in [k for k in _exact_results if k[0] == filename]:
+            del _exact_results[key]
+
+def _bump_version(name):
+    # Two loads of the same file must never end up with the same version
+    with _versions_lock:
+        dataset_versions[name] = dataset_versions.get(name, 0) + 1
+
+def _register_dataframe(filename, df, source_path=None, activate=True, invalidate=True):
+    global active_file
+    if SHARED_DATASET_STORE:
+        dataframes.store(filename, df, source_path)
+        if activate:
+            dataframes.set_active(filename)
+        dataset_versions[filename] = dataframes.version(filename)
+    else:
+        dataframes[filename] = df
+        _bump_version(filename)
+    if invalidate:
+        _invalidate_derived(filename)
+    if activate:
+        active_file = filename
+
+def dataset_names():
+    """Loaded datasets plus workbook sheets that load on first use."""
+    loaded = list(dataframes.keys())
+    with _sheets_lock:
+        pending = list(_pending_sheets)
+    return loaded + [name for name in pending if name not in loaded]
+
+def _pending_snapshot():
+    with _sheets_lock:
+        return dict(_pending_sheets)
+
+def _has_dataset(name):
+    return name in _pending_sheets or name in dataframes
+
+def dataset_loaded(name=None):
+    """Whether dataset `name` (default: the active one) is in memory, not a sheet still waiting to be parsed."""
+    name = name or active_file
+    return name is not None and name in dataframes and name not in _pending_sheets
+
+def _get_dataframe(name):
+    """The DataFrame of dataset `name`, parsing a pending workbook sheet on first use."""
+    if name in _pending_sheets:
+        def load():
+            with _sheets_lock:
+                pending = _pending_sheets.get(name)
+            if pending is None:
+                return  # Loaded by a caller that finished just before us
+            path, sheet, _ = pending
+            with telemetry.span("sheet_load"):
+                df = workbooks.read_sheet(path, sheet)
+            _register_dataframe(name, df, path, activate=False)
+            with _sheets_lock:
+                _pending_sheets.pop(name, None)
+            print(f"[SHEET] Loaded sheet '{sheet}' of {os.path.basename(path)} as '{name}': {len(df)} rows")
+        _inflight.do(("sheet", name), load)
+    return dataframes[name]
+
+def _load_workbook(file_path, filename):
+    """Register every sheet of a workbook as its own dataset without parsing any of them yet."""
+    global active_file
+    sheets = workbooks.list_sheets(file_path)
+    if not sheets:
+        return f"Error loading data: '{filename}' has no sheets."
+    names = workbooks.sheet_dataset_names(filename, [sheet for sheet, _ in sheets])
+
+    # Forget every sheet of an earlier upload of this workbook
+    prefix = f"{filename}{workbooks.SHEET_SEPARATOR}"
+    for name in [n for n in dataset_names() if n == filename or n.startswith(prefix)]:
+        with _sheets_lock:
+            _pending_sheets.pop(name, None)
+        if name in dataframes:
+            del dataframes[name]
+        _bump_version(name)
+        _invalidate_derived(name)
+
+    with _sheets_lock:
+        for name, (sheet, rows) in zip(names, sheets):
+            _pending_sheets[name] = (file_path, sheet, rows)
+    active_file = filename
+    if SHARED_DATASET_STORE:
+        # Other workers only see sheets once one of them has parsed them
+        _get_dataframe(filename)
+        dataframes.set_active(filename)
+    if len(names) == 1:
+        return f"Data loaded successfully. File '{filename}' is now active."
+    return f"Workbook loaded with {len(names)} sheets: {names}. Sheets load on first use. File '{filename}' (first sheet) is now active."
+
+def refresh_shared_state():
+    """Pick up datasets and documents uploaded through other worker processes (no-op without the shared store)."""
+    global active_file
+    if not SHARED_DATASET_STORE:
+        return
+    # Any catalog read may notice a change first, so changes are collected until taken here
+    for name in dataframes.take_changes():
+        version = dataframes.version(name)
+        if version is not None and version == dataset_versions.get(name):
+            # This process wrote that version itself and already updated its caches
+            continue
+        dataset_versions[name] = version
+        _invalidate_derived(name)
+    for name, document in dataframes.documents().items():
+        if _document_versions.get(name) != document["version"]:
+            _document_versions[name] = document["version"]
+            _extract_pdf(document["path"])
+    active_file = dataframes.active_file or active_file
+
+def _cacheable(result):
+    if isinstance(result, dict):
+        # Approximate charts are superseded by their exact version once it is ready
+        return "error" not in result and "approximation" not in result
+    return isinstance(result, str) and not result.startswith("Error")
+
+def _coalesce(kind, target_file, params, compute):
+    """
+    Run compute() once for concurrent identical requests against the same
+    dataset version, and keep the result for later identical requests.
+    """
+    key = (kind, target_file, dataset_versions.get(target_file), json.dumps(params, sort_keys=True, default=str))
+    with _results_lock:
+        cached = _results.get(key)
+        if cached is not None:
+            _results.move_to_end(key)
+    telemetry.cache_event(f"{kind}_result", cached is not None)
+    if cached is not None:
+        return cached
+
+    result, shared = _inflight.do(key, compute)
+    if shared:
+        print(f"[COALESCED] {kind} on {target_file} shared an in-flight computation")
+    elif _cacheable(result):
+        with _results_lock:
+            _results[key] = result
+            while len(_results) > RESULT_CACHE_ENTRIES:
+                _results.popitem(last=False)
+    return result
+
+def dataset_memory():
+    """{filename: (rows, bytes)} for the loaded datasets; deep sizes are computed once per dataset version."""
+    usage = {}
+    for name, df in list(dataframes.items()):
+        version = dataset_versions.get(name)
+        cached = _memory_usage.get(name)
+        if cached is None or cached[0] != version:
+            cached = _memory_usage[name] = (version, len(df), int(df.memory_usage(deep=True).sum()))
+        usage[name] = cached[1:]
+    return usage
+
+def _plotting():
+    """matplotlib (Agg backend) and seaborn, imported and themed on first use: most requests never render a PNG."""
+    if 'seaborn' not in sys.modules:
+        with importcost.timed("matplotlib + seaborn (first use)"):
+            import matplotlib
+            matplotlib.use('Agg')
+            import seaborn
+            seaborn.set_theme(style="darkgrid")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
 
 def load_data(file_path):
     global dataframes, active_file, knowledge_base
     filename = os.path.basename(file_path)
     try:
+        if SHARED_DATASET_STORE and file_path.endswith('.csv') and dataframes.is_current(filename, file_path):
+            # Another worker already parsed this exact file into the shared store
+            refresh_shared_state()
+            dataset_versions[filename] = dataframes.version(filename)
+            _dataset_sources[filename] = file_path
+            active_file = filename
+            return f"Data loaded successfully. File '{filename}' is now active."
         if file_path.endswith('.csv'):
             df = pd.read_csv(file_path)
-            dataframes[filename] = df
-            active_file = filename
+            _register_dataframe(filename, df, file_path)
+            _dataset_sources[filename] = file_path
             return f"Data loaded successfully. File '{filename}' is now active."
         elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
-            df = pd.read_excel(file_path)
-            dataframes[filename] = df
-            active_file = filename
-            return f"Data loaded successfully. File '{filename}' is now active."
+            return _load_workbook(file_path, filename)
         elif file_path.endswith('.pdf'):
             return load_pdf(file_path)
         else:
@@ -41,57 +322,248 @@ def load_data(file_path):
     except Exception as e:
         return f"Error loading data: {str(e)}"
 
+def append_data(file_path, target=None):
+    """
+    Append the rows of `file_path` to the loaded CSV dataset `target` (by
+    default the dataset with the same file name). The rows are appended to the
+    dataset's source file, and profiles and chart aggregates of the previous
+    version are extended with the new rows instead of being recomputed.
+    """
+    target = target or os.path.basename(file_path)
+    try:
+        refresh_shared_state()
+        source_path = _dataset_sources.get(target)
+        if source_path is None and SHARED_DATASET_STORE:
+            # Loaded by another worker: the catalog knows its source file (workbook sheets cannot be appended to)
+            source_path = dataframes.source_path(target)
+            if source_path and not source_path.endswith('.csv'):
+                source_path = None
+        if not _has_dataset(target):
+            return f"Error appending data: dataset '{target}' is not loaded."
+        if source_path is None:
+            return f"Error appending data: '{target}' was not loaded from a CSV file, only CSV datasets can be appended to."
+
+        if file_path.endswith('.csv'):
+            new_rows = pd.read_csv(file_path)
+        elif file_path.endswith('.xlsx') or file_path.endswith('.xls'):
+            new_rows = workbooks.read_sheet(file_path, workbooks.list_sheets(file_path)[0][0])
+        else:
+            return "Error appending data: unsupported file format, upload a CSV or Excel file."
+
+        old = _get_dataframe(target)
+        missing, extra = set(old.columns) - set(new_rows.columns), set(new_rows.columns) - set(old.columns)
+        if missing or extra:
+            return f"Error appending data: columns do not match '{target}' (missing: {sorted(missing)}, unexpected: {sorted(extra)})."
+        new_rows = new_rows[list(old.columns)]
+        if new_rows.empty:
+            return f"No new rows to append to '{target}'."
+
+        # Keep the source file complete, so a restart loads every row. It is written
+        # first because the shared store records its size, and cut back if memory is not updated
+        original_size = os.path.getsize(source_path)
+        try:
+            with open(source_path, 'rb+') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b'\n':
+                        f.write(b'\n')
+            new_rows.to_csv(source_path, mode='a', header=False, index=False)
+
+            old_version = dataset_versions.get(target)
+            combined = pd.concat([old, new_rows], ignore_index=True)
+            _register_dataframe(target, combined, source_path, invalidate=False)
+        except Exception:
+            with open(source_path, 'rb+') as f:
+                f.truncate(original_size)
+            raise
+        version = dataset_versions[target]
+        try:
+            _extend_derived(target, old_version, version, new_rows, combined.dtypes)
+        except Exception as e:
+            # The data itself is appended; derived state is rebuilt from it on demand
+            print(f"[APPEND] Could not extend cached statistics of '{target}', dropping them: {e}")
+            _invalidate_derived(target)
+        print(f"[APPEND] {len(new_rows)} rows appended to '{target}', now {len(combined)} rows")
+        return f"Appended {len(new_rows)} rows to '{target}' ({len(combined)} rows in total). File '{target}' is now active."
+    except Exception as e:
+        return f"Error appending data: {str(e)}"
+
+def _extend_derived(filename, old_version, version, new_rows, dtypes):
+    """Carry the derived state of `old_version` over to `version` by adding `new_rows`."""
+    # Only the appended rows are scanned, so the lock is held throughout
+    with _derived_lock:
+        cached = _profiles.get(filename)
+        if cached is not None and cached[0] == old_version:
+            try:
+                cached[1].update(new_rows, dtypes)
+                _profiles[filename] = (version, cached[1])
+            except ValueError:
+                # Column types changed with the new rows, the next summary rebuilds the profile
+                del _profiles[filename]
+
+        for key, (cached_version, aggregate) in list(_aggregates.items()):
+            if key[0] != filename:
+                continue
+            _, group_column, value_column, filter_column, filter_value = key
+            rows = new_rows
+            if filter_column and filter_value:
+                rows = rows[rows[filter_column] == filter_value]
+            if cached_version == old_version and (value_column is None or incremental.is_numeric(dtypes[value_column])):
+                _aggregates[key] = (version, aggregate.merge(incremental.GroupedAggregate.from_frame(rows, group_column, value_column)))
+            else:
+                del _aggregates[key]
+
+    # Samples and finished approximate charts are not worth patching, they are rebuilt on demand
+    sampling.invalidate(filename)
+    with _exact_lock:
+        for key in [k for k in _exact_results if k[0] == filename]:
+            del _exact_results[key]
+
+def _pypdf():
+    """pypdf, imported on first use: only PDF uploads need it."""
+    if 'pypdf' not in sys.modules:
+        with importcost.timed("pypdf (first use)"):
+            import pypdf
+    return sys.modules['pypdf']
+
+def _extract_pdf_chunks(file_path):
+    pypdf = _pypdf()
+    filename = os.path.basename(file_path)
+    reader = pypdf.PdfReader(file_path)
+    chunks = []
+    
+    for i, page in enumerate(reader.pages):
+        text = page.extract_text()
+        if text:
+            # Size-bounded, overlapping windows that prefer paragraph and sentence breaks
+            for window in chunking.split_text(text):
+                chunks.append({
+                    "text": window,
+                    "source": filename,
+                    "page": i + 1
+                })
+    
+    # Drop repeated headers, footers and boilerplate paragraphs
+    duplicate = chunking.near_duplicates([chunk["text"] for chunk in chunks])
+    return [chunk for chunk, is_duplicate in zip(chunks, duplicate) if not is_duplicate]
+
+def _extract_pdf(file_path):
+    """
+    Add the chunks of a PDF to knowledge_base, replacing any earlier upload with
+    the same name or content. Only re-extracts if the content is not in kb_store yet.
+    Returns the number of chunks of this document.
+    """
+    global _kb_version
+    filename = os.path.basename(file_path)
+    doc_hash = kb_store.document_hash(file_path)
+    store_key = f"{doc_hash}-c{chunking.CHUNKER_VERSION}"
+    if kb_store.has(store_key):
+        chunks = kb_store.load_chunks(store_key, filename)
+        print(f"[KB] Loaded {len(chunks)} stored chunks for '{filename}'")
+    else:
+        chunks = _extract_pdf_chunks(file_path)
+        kb_store.save_chunks(store_key, chunks)
+        print(f"[KB] Extracted and stored {len(chunks)} chunks for '{filename}'")
+    for chunk in chunks:
+        chunk["doc_hash"] = doc_hash
+
+    # Tokenized once per document content; the vector index only recombines them
+    terms_name = f"terms{retrieval.HASH_DIM}"
+    terms = kb_store.load_term_rows(store_key, terms_name)
+    if terms is None:
+        terms = retrieval.term_rows([chunk["text"] for chunk in chunks])
+        kb_store.save_term_rows(store_key, terms_name, terms)
+    
+    with _kb_lock:
+        _kb_terms[doc_hash] = terms
+        knowledge_base[:] = [
+            chunk for chunk in knowledge_base
+            if chunk["source"] != filename and chunk.get("doc_hash") != doc_hash
+        ]
+        knowledge_base.extend(chunks)
+        live = {chunk["doc_hash"] for chunk in knowledge_base}
+        for stale in [h for h in _kb_terms if h not in live]:
+            del _kb_terms[stale]
+        _kb_version += 1
+    return len(chunks)
+
 def load_pdf(file_path):
     global knowledge_base
     filename = os.path.basename(file_path)
     try:
-        reader = pypdf.PdfReader(file_path)
-        text_chunks = []
-        
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()
-            if text:
-                # Simple chunking by paragraphs or fixed size
-                # Here we just split by double newlines for paragraphs
-                paragraphs = text.split('\n\n')
-                for para in paragraphs:
-                    if len(para.strip()) > 50:  # Ignore very short chunks
-                        knowledge_base.append({
-                            "text": para.strip(),
-                            "source": filename,
-                            "page": i + 1
-                        })
+        chunk_count = _extract_pdf(file_path)
+        if SHARED_DATASET_STORE:
+            dataframes.add_document(filename, file_path)
+            _document_versions[filename] = dataframes.documents()[filename]["version"]
         
-        return f"PDF loaded successfully. Extracted {len(knowledge_base)} text chunks from '{filename}'."
+        return f"PDF loaded successfully. Extracted {chunk_count} text chunks from '{filename}'."
     except Exception as e:
         return f"Error loading PDF: {str(e)}"
 
-def query_knowledge_base(query: str):
+def _get_vector_index():
+    """(chunks, VectorIndex) of one knowledge base version, so search hits index into the returned chunks."""
+    global _vector_index
+    with _kb_lock:
+        chunks, version, cached = list(knowledge_base), _kb_version, _vector_index
+        if cached is not None and cached[0] == version:
+            return chunks, cached[1]
+        # Chunks of one document are contiguous in knowledge_base, in the order of its term rows
+        documents = [doc_hash for doc_hash, _ in itertools.groupby(chunk["doc_hash"] for chunk in chunks)]
+        terms = [_kb_terms[h] for h in documents]
+    index = retrieval.VectorIndex(terms=retrieval.concat_term_rows(terms))
+    with _kb_lock:
+        if _kb_version == version:
+            _vector_index = (version, index)
+    print(f"[KB] Built vector index over {len(chunks)} chunks")
+    return chunks, index
+
+def query_knowledge_base(query: str, mode: str = None):
     """
     Search the knowledge base for relevant text chunks based on the query.
-    Uses simple keyword matching.
+    
+    Args:
+        query: The search query
+        mode: 'keyword' (term overlap), 'vector' (local TF-IDF/LSA cosine) or
+            'hybrid' (rank fusion of both); defaults to KB_RETRIEVAL_MODE
     """
-    print(f"[TOOL CALLED] query_knowledge_base: query='{query}'")
+    mode = mode or KB_RETRIEVAL_MODE
+    print(f"[TOOL CALLED] query_knowledge_base: query='{query}', mode={mode}")
     global knowledge_base
+    refresh_shared_state()
     
-    if not knowledge_base:
+    # One consistent snapshot, even while a background upload changes the knowledge base
+    if mode in ('vector', 'hybrid'):
+        chunks, index = _get_vector_index()
+    else:
+        with _kb_lock:
+            chunks = list(knowledge_base)
+    if not chunks:
         return "Knowledge base is empty. Please upload a PDF file first."
     
-    # Simple keyword scoring
-    query_terms = set(re.findall(r'\w+', query.lower()))
     scored_chunks = []
+    if mode in ('keyword', 'hybrid'):
+        # Simple keyword scoring
+        query_terms = set(re.findall(r'\w+', query.lower()))
+        for i, chunk in enumerate(chunks):
+            chunk_text = chunk['text'].lower()
+            score = sum(1 for term in query_terms if term in chunk_text)
+            if score > 0:
+                scored_chunks.append((score, i))
+        
+        # Sort by score descending
+        scored_chunks.sort(key=lambda x: x[0], reverse=True)
     
-    for chunk in knowledge_base:
-        chunk_text = chunk['text'].lower()
-        score = sum(1 for term in query_terms if term in chunk_text)
-        if score > 0:
-            scored_chunks.append((score, chunk))
-    
-    # Sort by score descending
-    scored_chunks.sort(key=lambda x: x[0], reverse=True)
+    if mode in ('vector', 'hybrid'):
+        vector_hits = [(i, score) for i, score in index.search([query], k=KB_VECTOR_CANDIDATES)[0] if score > 0]
+        if mode == 'vector':
+            scored_chunks = [(score, i) for i, score in vector_hits]
+        else:
+            fused = retrieval.reciprocal_rank_fusion([[i for _, i in scored_chunks], [i for i, _ in vector_hits]])
+            scored_chunks = [(score, i) for i, score in fused]
     
     # Return top 5 chunks
-    top_chunks = scored_chunks[:5]
+    top_chunks = [(score, chunks[i]) for score, i in scored_chunks[:5]]
     
     if not top_chunks:
         return "No relevant information found in the uploaded documents."
@@ -103,33 +575,213 @@ def query_knowledge_base(query: str):
         
     return result
 
+def _profile(name, df):
+    """The DatasetProfile of the current version of `name`."""
+    version = dataset_versions.get(name)
+    with _derived_lock:
+        cached = _profiles.get(name)
+    telemetry.cache_event("profile", cached is not None and cached[0] == version)
+    if cached is None or cached[0] != version:
+        cached = (version, incremental.DatasetProfile(df))
+        with _derived_lock:
+            _profiles[name] = cached
+    return cached[1]
+
 def get_data_summary():
     global dataframes
-    if not dataframes:
+    refresh_shared_state()
+    if not dataset_names():
         return "No data loaded."
     
     summary = "Loaded Files:\n"
-    for name, df in dataframes.items():
+    for name, (path, sheet, rows) in _pending_snapshot().items():
+        if name not in dataframes:
+            size = f"{rows - 1} rows" if rows else "unknown size"
+            summary += f"\n--- File: {name} ---\nSheet '{sheet}' of {os.path.basename(path)} ({size}), parsed on first use\n"
+    for name, df in list(dataframes.items()):
         summary += f"\n--- File: {name} ---\n"
-        summary += f"Columns: {df.columns.tolist()}\n"
-        summary += f"Head:\n{df.head().to_string()}\n"
+        summary += _profile(name, df).text()
     return summary
 
 def get_data_json(filename: str = None):
-    global dataframes, active_file
+    return get_data_page(filename)
+
+def _filter_value(series, value):
+    """Coerce a query-string value to the type of `series` for an equality filter."""
+    if pd.api.types.is_bool_dtype(series):
+        return str(value).lower() in ('true', '1', 'yes')
+    if pd.api.types.is_numeric_dtype(series):
+        try:
+            return float(value)
+        except ValueError:
+            return value
+    return value
+
+def _sorted_positions(series, descending):
+    try:
+        ordered = series.reset_index(drop=True).sort_values(ascending=not descending, kind='stable', na_position='last')
+    except TypeError:
+        # Mixed-type object column: order by text
+        ordered = series.reset_index(drop=True).astype(str).sort_values(ascending=not descending, kind='stable')
+    return _positions(ordered.index.to_numpy(), len(series))
+
+def _positions(array, rows):
+    # Half the memory of int64 for every frame under 2**31 rows
+    return array.astype(np.int32 if rows <= np.iinfo(np.int32).max else np.int64, copy=False)
+
+def _row_order(target_file, df, sort_by, descending, filters):
+    """
+    Positions of the rows matching the equality `filters`, in `sort_by` order.
+    Cached per dataset version, up to PREVIEW_ORDERS_MAX_MB in total, so later
+    pages are a slice; a filtered order reuses the cached full sort of its column.
+    """
+    global _row_orders_bytes
+    key = (target_file, dataset_versions.get(target_file), sort_by, descending, tuple(sorted(filters.items())))
+    with _row_orders_lock:
+        order = _row_orders.get(key)
+        if order is not None:
+            _row_orders.move_to_end(key)
+    telemetry.cache_event("row_order", order is not None)
+    if order is not None:
+        return order
+
+    if filters:
+        mask = np.ones(len(df), dtype=bool)
+        for column, value in filters.items():
+            mask &= (df[column] == _filter_value(df[column], value)).to_numpy(dtype=bool, na_value=False)
+        if sort_by:
+            base = _row_order(target_file, df, sort_by, descending, {})
+            order = base[mask[base]]
+        else:
+            order = _positions(np.flatnonzero(mask), len(df))
+    else:
+        order = _sorted_positions(df[sort_by], descending)
+
+    max_bytes = PREVIEW_ORDERS_MAX_MB * 1024 * 1024
+    if order.nbytes > max_bytes:
+        return order
+    with _row_orders_lock:
+        if key not in _row_orders:
+            _row_orders[key] = order
+            _row_orders_bytes += order.nbytes
+        while _row_orders_bytes > max_bytes:
+            _row_orders_bytes -= _row_orders.popitem(last=False)[1].nbytes
+    return order
+
+def get_data_page(filename: str = None, offset: int = 0, limit: int = 10, columns: list = None,
+                  sort_by: str = None, descending: bool = False, filters: dict = None):
+    """
+    One page of a dataset: rows [offset, offset + limit) after the equality
+    `filters` and the sort, restricted to `columns`. Unsorted, unfiltered pages
+    are plain slices; otherwise the row order is computed once and cached.
+    Returns None if no dataset is loaded; raises ValueError for unknown columns.
+    """
+    refresh_shared_state()
     target_file = filename or active_file
-    
-    if target_file and target_file in dataframes:
-        df = dataframes[target_file]
-        return {
-            "filename": target_file,
-            "columns": df.columns.tolist(),
-            "data": df.head(10).to_dict(orient='records'),
-            "total_rows": len(df)
-        }
+    if not target_file or not _has_dataset(target_file):
+        return None
+
+    df = _get_dataframe(target_file)
+    filters = filters or {}
+    requested = list(columns or []) + ([sort_by] if sort_by else []) + list(filters)
+    unknown = [column for column in requested if column not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {unknown}")
+    offset = max(offset, 0)
+    limit = min(max(limit, 0), PREVIEW_MAX_ROWS)
+
+    if sort_by or filters:
+        order = _row_order(target_file, df, sort_by, descending, filters)
+        page = df.iloc[order[offset:offset + limit]]
+        matched_rows = len(order)
+    else:
+        page = df.iloc[offset:offset + limit]
+        matched_rows = len(df)
+    if columns:
+        page = page[list(columns)]
+
+    return {
+        "filename": target_file,
+        "version": dataset_versions.get(target_file),
+        "columns": page.columns.tolist(),
+        "data": page.to_dict(orient='records'),
+        "total_rows": len(df),
+        "matched_rows": matched_rows,
+        "offset": offset,
+        "limit": limit
+    }
+
+def _aggregate(target_file, df, group_column, value_column, filter_column, filter_value):
+    """GroupedAggregate of the (already filtered) `df`, kept per dataset version and extended on append."""
+    key = (target_file, group_column, value_column, filter_column, filter_value)
+    version = dataset_versions.get(target_file)
+    with _derived_lock:
+        cached = _aggregates.get(key)
+    telemetry.cache_event("aggregate", cached is not None and cached[0] == version)
+    if cached is None or cached[0] != version:
+        cached = (version, incremental.GroupedAggregate.from_frame(df, group_column, value_column))
+        with _derived_lock:
+            _aggregates[key] = cached
+    return cached[1]
+
+def _value_counts(target_file, df, column, filter_column, filter_value):
+    """df[column].value_counts(), from the maintained aggregate."""
+    counts = _aggregate(target_file, df, column, None, filter_column, filter_value).result('count')
+    return counts.sort_values(ascending=False, kind='stable').rename_axis(column).rename('count')
+
+def _group_aggregate(target_file, df, group_column, value_column, aggregation, filter_column, filter_value):
+    """df.groupby(group_column)[value_column].agg(aggregation), from the maintained aggregate when it decomposes."""
+    if aggregation not in incremental.DECOMPOSABLE or not incremental.is_numeric(df[value_column].dtype):
+        return df.groupby(group_column)[value_column].agg(aggregation)
+    return _aggregate(target_file, df, group_column, value_column, filter_column, filter_value).result(aggregation)
+
+def _approximation_plan(chart_type, x_column, y_column, aggregation, group_by):
+    """
+    Map chart parameters onto the aggregation generate_chart_data would run.
+    Returns (group column, value column, aggregation, value name, sort by value) or None.
+    """
+    if chart_type == 'pie':
+        if aggregation == 'count' or not y_column:
+            return x_column, None, 'count', 'value', True
+        if aggregation:
+            return x_column, y_column, aggregation, 'value', False
+        return None
+    if aggregation and group_by:
+        if aggregation == 'count':
+            return group_by, None, 'count', 'count', False
+        return group_by, y_column, aggregation, y_column, False
+    if aggregation == 'count' and x_column:
+        return x_column, None, 'count', 'count', True
     return None
 
-def generate_chart_data(
+def _compute_exact_in_background(key, params):
+    """Run the exact version of an approximate chart request and keep it for the next identical call."""
+    with _exact_lock:
+        if key in _exact_pending or key in _exact_results:
+            return
+        _exact_pending.add(key)
+
+    def run():
+        try:
+            chart_config = build_chart_config(**params)
+            if "error" not in chart_config:
+                with _exact_lock:
+                    _exact_results[key] = chart_config
+                print(f"[EXACT READY] {params.get('title')} on {key[0]}")
+            return chart_config
+        finally:
+            with _exact_lock:
+                _exact_pending.discard(key)
+
+    # The shared job workers bound how many full scans run at once
+    try:
+        jobs.scheduler.submit("exact_chart", run, priority=EXACT_JOB_PRIORITY)
+    except jobs.QueueFull:
+        print(f"[EXACT SKIPPED] Job queue is full, {params.get('title')} stays approximate")
+        with _exact_lock:
+            _exact_pending.discard(key)
+
+def _compute_chart_config(
     chart_type: str,
     x_column: str = None,
     y_column: str = None,
@@ -138,58 +790,26 @@ def generate_chart_data(
     filter_column: str = None,
     filter_value: str = None,
     aggregation: str = None,
-    group_by: str = None
+    group_by: str = None,
+    approximate: bool = False
 ):
-    """
-    Generate chart configuration and data for frontend rendering.
-    Returns structured JSON instead of creating a PNG image.
-    
-    Args:
-        chart_type: Type of chart - 'bar', 'line', 'scatter', 'pie', 'area'
-        x_column: Column for X-axis
-        y_column: Column for Y-axis (optional for some charts)
-        title: Chart title
-        filename: Data file to use (defaults to active file)
-        filter_column: Column to filter on (optional)
-        filter_value: Value to filter for (optional)
-        aggregation: Aggregation function - 'count', 'sum', 'mean', 'median', 'min', 'max' (optional)
-        group_by: Column to group by before aggregation (optional)
-    
-    Returns:
-        JSON string with chart configuration and data
-    """
-    print(f"[TOOL CALLED] generate_chart_data: type={chart_type}, x={x_column}, y={y_column}, filter={filter_column}={filter_value}, agg={aggregation}, group={group_by}")
+    """Uncoalesced body of build_chart_config."""
+    print(f"[TOOL CALLED] generate_chart_data: type={chart_type}, x={x_column}, y={y_column}, filter={filter_column}={filter_value}, agg={aggregation}, group={group_by}, approx={approximate}")
     
     global dataframes, active_file
+    refresh_shared_state()
     target_file = filename or active_file
     
-    if not target_file or target_file not in dataframes:
-        return json.dumps({"error": "No data loaded or file not found."})
+    if not target_file or not _has_dataset(target_file):
+        return {"error": "No data loaded or file not found."}
 
-    df = dataframes[target_file].copy()
+    exact_params = {
+        'chart_type': chart_type, 'x_column': x_column, 'y_column': y_column, 'title': title,
+        'filename': target_file, 'filter_column': filter_column, 'filter_value': filter_value,
+        'aggregation': aggregation, 'group_by': group_by
+    }
     
     try:
-        # Apply filter if specified
-        if filter_column and filter_value:
-            df = df[df[filter_column] == filter_value]
-            print(f"[FILTER] Filtered {len(df)} rows where {filter_column}={filter_value}")
-        
-        # Handle aggregations
-        if aggregation and group_by:
-            if aggregation == 'count':
-                plot_data = df.groupby(group_by).size().reset_index(name='count')
-                x_column = group_by
-                y_column = 'count'
-            else:
-                plot_data = df.groupby(group_by)[y_column].agg(aggregation).reset_index()
-                x_column = group_by
-        elif aggregation == 'count' and x_column:
-            plot_data = df[x_column].value_counts().reset_index()
-            plot_data.columns = [x_column, 'count']
-            y_column = 'count'
-        else:
-            plot_data = df
-        
         # Normalize chart_type (map old types to frontend-compatible types)
         chart_type_map = {
             'hist': 'bar',
@@ -199,31 +819,89 @@ def generate_chart_data(
             'heatmap': 'bar'
         }
         normalized_chart_type = chart_type_map.get(chart_type, chart_type)
-        
-        # Special handling for pie charts
-        if normalized_chart_type == 'pie':
-            # Pie charts need aggregated data (categories and values)
-            if aggregation == 'count' or not y_column:
-                # Count occurrences of x_column
-                plot_data = df[x_column].value_counts().reset_index()
-                plot_data.columns = [x_column, 'value']
-                y_column = 'value'
-                print(f"[PIE CHART] Auto-aggregated {x_column} into value counts")
+
+        approximation = None
+        source = _get_dataframe(target_file)
+        plan = _approximation_plan(normalized_chart_type, x_column, y_column, aggregation, group_by) if approximate else None
+        if plan and plan[0] and plan[2] in sampling.SUPPORTED_AGGREGATIONS and len(source) >= sampling.APPROX_MIN_ROWS:
+            version = dataset_versions.get(target_file)
+            exact_key = (target_file, version, json.dumps(exact_params, sort_keys=True))
+            with _exact_lock:
+                exact_config = _exact_results.get(exact_key)
+            telemetry.cache_event("exact_chart", exact_config is not None)
+            if exact_config is not None:
+                print("[TOOL RETURN] Exact chart config from background computation")
+                return exact_config
+
+            group_column, value_column, agg, value_name, sort_by_value = plan
+            sample = sampling.get_sample(target_file, source, version, group_column)
+            plot_data = sampling.approximate_aggregate(
+                sample, group_column, value_column, agg, value_name,
+                filter_column=filter_column, filter_value=filter_value
+            )
+            if sort_by_value:
+                plot_data = plot_data.sort_values(value_name, ascending=False, ignore_index=True)
+            x_column, y_column = group_column, value_name
+            approximation = {
+                "method": "stratified_sample",
+                "sample_rows": len(sample),
+                "population_rows": len(source),
+                "confidence": 0.95,
+                "ci_low_key": f"{value_name}_ci_low",
+                "ci_high_key": f"{value_name}_ci_high",
+                "exact_pending": True
+            }
+            _compute_exact_in_background(exact_key, exact_params)
+            print(f"[APPROX] {agg} of {value_column or 'rows'} by {group_column} from {len(sample)}/{len(source)} sampled rows")
+        else:
+            # No defensive copy: every step below builds a new frame, and copying
+            # would pull a shared memory-mapped dataset into private memory
+            df = source
+
+            # Apply filter if specified
+            if filter_column and filter_value:
+                df = df[df[filter_column] == filter_value]
+                print(f"[FILTER] Filtered {len(df)} rows where {filter_column}={filter_value}")
+            
+            # Handle aggregations
+            # Count, sum, mean, min and max come from aggregates that appends update in place
+            if aggregation and group_by:
+                if aggregation == 'count':
+                    plot_data = _aggregate(target_file, df, group_by, None, filter_column, filter_value).result('count').reset_index(name='count')
+                    x_column = group_by
+                    y_column = 'count'
+                else:
+                    plot_data = _group_aggregate(target_file, df, group_by, y_column, aggregation, filter_column, filter_value).reset_index()
+                    x_column = group_by
+            elif aggregation == 'count' and x_column:
+                plot_data = _value_counts(target_file, df, x_column, filter_column, filter_value).reset_index()
+                plot_data.columns = [x_column, 'count']
+                y_column = 'count'
             else:
-                # Use provided y_column as values
-                # Group by x_column and sum/mean the y_column
-                if aggregation:
-                    plot_data = df.groupby(x_column)[y_column].agg(aggregation).reset_index()
+                plot_data = df
+            
+            # Special handling for pie charts
+            if normalized_chart_type == 'pie':
+                # Pie charts need aggregated data (categories and values)
+                if aggregation == 'count' or not y_column:
+                    # Count occurrences of x_column
+                    plot_data = _value_counts(target_file, df, x_column, filter_column, filter_value).reset_index()
                     plot_data.columns = [x_column, 'value']
                     y_column = 'value'
+                    print(f"[PIE CHART] Auto-aggregated {x_column} into value counts")
                 else:
-                    # Just select the two columns
-                    plot_data = df[[x_column, y_column]].copy()
+                    # Use provided y_column as values
+                    # Group by x_column and sum/mean the y_column
+                    if aggregation:
+                        plot_data = _group_aggregate(target_file, df, x_column, y_column, aggregation, filter_column, filter_value).reset_index()
+                        plot_data.columns = [x_column, 'value']
+                        y_column = 'value'
+                    else:
+                        # Just select the two columns
+                        plot_data = df[[x_column, y_column]].copy()
         
-        # Limit data to reasonable size for frontend
-        if len(plot_data) > 100:
-            plot_data = plot_data.head(100)
-            print(f"[WARNING] Data truncated to 100 rows for frontend rendering")
+        # Bound the point count for the frontend while keeping the shape of the data
+        plot_data = downsampling.reduce_for_chart(plot_data, normalized_chart_type, x_column, y_column)
         
         # Convert data to list of dictionaries
         data_records = plot_data.to_dict('records')
@@ -239,20 +917,20 @@ def generate_chart_data(
             "x_label": x_column,
             "y_label": y_column or aggregation
         }
+        if approximation:
+            chart_config["approximation"] = approximation
         
-        result = json.dumps(chart_config)
         print(f"[TOOL RETURN] Chart config with {len(data_records)} data points")
-        return result
+        return chart_config
         
     except Exception as e:
         error_msg = f"Error generating chart data: {str(e)}"
         print(f"[TOOL ERROR] {error_msg}") 
         import traceback
         traceback.print_exc()
-        return json.dumps({"error": error_msg})
+        return {"error": error_msg}
 
-
-def create_visualization(
+def build_chart_config(
     chart_type: str,
     x_column: str = None,
     y_column: str = None,
@@ -261,13 +939,16 @@ def create_visualization(
     filter_column: str = None,
     filter_value: str = None,
     aggregation: str = None,
-    group_by: str = None
+    group_by: str = None,
+    approximate: bool = False
 ):
     """
-    Flexible chart generation tool that can handle filtering, grouping, and aggregations.
+    Generate chart configuration and data for frontend rendering.
+    Returns the chart configuration as a dict ({"error": ...} on failure);
+    generate_chart_data is the JSON-returning tool wrapper.
     
     Args:
-        chart_type: Type of chart - 'bar', 'line', 'scatter', 'hist', 'pie', 'box', 'violin', 'heatmap', 'area', 'count'
+        chart_type: Type of chart - 'bar', 'line', 'scatter', 'pie', 'area'
         x_column: Column for X-axis
         y_column: Column for Y-axis (optional for some charts)
         title: Chart title
@@ -276,106 +957,202 @@ def create_visualization(
         filter_value: Value to filter for (optional)
         aggregation: Aggregation function - 'count', 'sum', 'mean', 'median', 'min', 'max' (optional)
         group_by: Column to group by before aggregation (optional)
+        approximate: Answer count/sum/mean/median aggregations on very large files
+            from a stratified sample, with 95% confidence bounds (optional)
     
-    Examples:
-        - Count of students by sex: chart_type='bar', x_column='sex', aggregation='count'
-        - Students with mother='teacher' by sex: chart_type='bar', x_column='sex', filter_column='Mjob', filter_value='teacher', aggregation='count'
-        - Average age by school: chart_type='bar', x_column='school', y_column='age', aggregation='mean'
+    Returns:
+        Chart configuration dict with data
     """
-    print(f"[TOOL CALLED] create_visualization: type={chart_type}, x={x_column}, y={y_column}, filter={filter_column}={filter_value}, agg={aggregation}, group={group_by}")
-    
-    global dataframes, active_file
-    target_file = filename or active_file
+    refresh_shared_state()
+    params = {
+        'chart_type': chart_type, 'x_column': x_column, 'y_column': y_column, 'title': title,
+        'filename': filename or active_file, 'filter_column': filter_column, 'filter_value': filter_value,
+        'aggregation': aggregation, 'group_by': group_by, 'approximate': approximate
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    def compute():
+        chart_config = _compute_chart_config(**params)
+        if "error" not in chart_config:
+            # Stored with the chat history, so warm-up can replay popular charts
+            chart_config = dict(chart_config, spec=params)
+        return chart_config
+    return _coalesce("chart", params.get('filename'), params, compute)
+
+def generate_chart_data(
+    chart_type: str,
+    x_column: str = None,
+    y_column: str = None,
+    title: str = "Chart",
+    filename: str = None,
+    filter_column: str = None,
+    filter_value: str = None,
+    aggregation: str = None,
+    group_by: str = None,
+    approximate: bool = False
+):
+    """
+    Generate chart configuration and data for frontend rendering.
+    Returns structured JSON instead of creating a PNG image.
+    See build_chart_config for the arguments.
     
-    if not target_file or target_file not in dataframes:
-        return "Error: No data loaded or file not found."
+    Returns:
+        JSON string with chart configuration and data
+    """
+    return serialization.dumps(build_chart_config(
+        chart_type, x_column, y_column, title, filename,
+        filter_column, filter_value, aggregation, group_by, approximate
+    ))
+
+
+def _image_options(image_format=None, dpi=None):
+    """Validated (format, dpi); raises ValueError on an unsupported format."""
+    image_format = (image_format or CHART_IMAGE_FORMAT).lower()
+    if image_format == 'jpeg':
+        image_format = 'jpg'
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format '{image_format}', use one of {', '.join(IMAGE_FORMATS)}")
+    low, high = CHART_IMAGE_DPI_RANGE
+    return image_format, min(max(int(dpi or CHART_IMAGE_DPI), low), high)
+
+def _new_figure(figsize):
+    # Figures made without pyplot are not tracked by it, so they never need plt.close
+    _plotting()
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+def _reused_panel_figure():
+    """The shared single-panel figure, cleared. Callers hold _render_lock."""
+    global _panel_figure
+    if _panel_figure is None:
+        _panel_figure = _new_figure(PANEL_SIZE)
+    _panel_figure.clear()
+    return _panel_figure
 
-    df = dataframes[target_file].copy()
+def _save_figure(fig, image_format, dpi):
+    """Write `fig` to STATIC_DIR and return its markdown image link."""
+    fig.tight_layout()
+    chart_filename = f"{uuid.uuid4()}.{image_format}"
+    fig.savefig(os.path.join(STATIC_DIR, chart_filename), format=image_format, dpi=dpi)
+    return f"![Chart](/static/charts/{chart_filename})"
+
+def _draw_chart(
+    ax,
+    df,
+    chart_type: str,
+    x_column: str = None,
+    y_column: str = None,
+    title: str = "Chart",
+    filter_column: str = None,
+    filter_value: str = None,
+    aggregation: str = None,
+    group_by: str = None
+):
+    """Filter, aggregate and plot `df` onto the axes `ax`. Raises on bad columns or parameters."""
+    _, sns = _plotting()
+
+    # Apply filter if specified
+    if filter_column and filter_value:
+        df = df[df[filter_column] == filter_value]
+        print(f"[FILTER] Filtered {len(df)} rows where {filter_column}={filter_value}")
     
-    try:
-        # Apply filter if specified
-        if filter_column and filter_value:
-            df = df[df[filter_column] == filter_value]
-            print(f"[FILTER] Filtered {len(df)} rows where {filter_column}={filter_value}")
-        
-        # Handle aggregations
-        if aggregation and group_by:
-            if aggregation == 'count':
-                plot_data = df.groupby(group_by).size().reset_index(name='count')
-                x_column = group_by
-                y_column = 'count'
-            else:
-                plot_data = df.groupby(group_by)[y_column].agg(aggregation).reset_index()
-                x_column = group_by
-        elif aggregation == 'count' and x_column:
-            plot_data = df[x_column].value_counts().reset_index()
-            plot_data.columns = [x_column, 'count']
+    # Handle aggregations
+    if aggregation and group_by:
+        if aggregation == 'count':
+            plot_data = df.groupby(group_by).size().reset_index(name='count')
+            x_column = group_by
             y_column = 'count'
         else:
-            plot_data = df
-        
-        # Create figure
-        plt.figure(figsize=(10, 6))
-        sns.set_theme(style="darkgrid")
-        
-        # Generate chart based on type
-        if chart_type == 'bar':
-            if y_column:
-                sns.barplot(data=plot_data, x=x_column, y=y_column)
-            else:
-                plot_data[x_column].value_counts().plot(kind='bar')
-                
-        elif chart_type == 'count':
-            # Special case for count plots
-            if filter_column and filter_value:
-                sns.countplot(data=df, x=x_column)
-            else:
-                sns.countplot(data=plot_data, x=x_column)
-                
-        elif chart_type == 'line':
-            sns.lineplot(data=plot_data, x=x_column, y=y_column)
-            
-        elif chart_type == 'scatter':
-            sns.scatterplot(data=plot_data, x=x_column, y=y_column)
-            
-        elif chart_type == 'hist':
-            sns.histplot(data=plot_data, x=x_column, bins=20)
-            
-        elif chart_type == 'box':
-            sns.boxplot(data=plot_data, x=x_column, y=y_column)
+            plot_data = df.groupby(group_by)[y_column].agg(aggregation).reset_index()
+            x_column = group_by
+    elif aggregation == 'count' and x_column:
+        plot_data = df[x_column].value_counts().reset_index()
+        plot_data.columns = [x_column, 'count']
+        y_column = 'count'
+    else:
+        plot_data = df
+    
+    # Generate chart based on type
+    if chart_type == 'bar':
+        if y_column:
+            sns.barplot(data=plot_data, x=x_column, y=y_column, ax=ax)
+        else:
+            plot_data[x_column].value_counts().plot(kind='bar', ax=ax)
             
-        elif chart_type == 'violin':
-            sns.violinplot(data=plot_data, x=x_column, y=y_column)
+    elif chart_type == 'count':
+        # Special case for count plots
+        if filter_column and filter_value:
+            sns.countplot(data=df, x=x_column, ax=ax)
+        else:
+            sns.countplot(data=plot_data, x=x_column, ax=ax)
             
-        elif chart_type == 'pie':
-            if aggregation == 'count' or not y_column:
-                data = plot_data[x_column].value_counts() if x_column in plot_data.columns else plot_data['count']
-                plt.pie(data, labels=data.index, autopct='%1.1f%%')
-            else:
-                plt.pie(plot_data[y_column], labels=plot_data[x_column], autopct='%1.1f%%')
-                
-        elif chart_type == 'heatmap':
-            if not x_column and not y_column:
-                sns.heatmap(plot_data.select_dtypes(include=['number']).corr(), annot=True, cmap='coolwarm')
-            else:
-                pivot_data = plot_data.pivot_table(values=y_column, index=x_column, columns=group_by, aggfunc=aggregation or 'mean')
-                sns.heatmap(pivot_data, annot=True, cmap='coolwarm')
-                
-        elif chart_type == 'area':
-            plot_data.plot.area(x=x_column, y=y_column)
+    elif chart_type == 'line':
+        sns.lineplot(data=plot_data, x=x_column, y=y_column, ax=ax)
         
-        # Set title
-        filter_text = f" (filtered: {filter_column}={filter_value})" if filter_column and filter_value else ""
-        plt.title(f"{title}{filter_text}")
-        plt.tight_layout()
+    elif chart_type == 'scatter':
+        sns.scatterplot(data=plot_data, x=x_column, y=y_column, ax=ax)
+        
+    elif chart_type == 'hist':
+        sns.histplot(data=plot_data, x=x_column, bins=20, ax=ax)
+        
+    elif chart_type == 'box':
+        sns.boxplot(data=plot_data, x=x_column, y=y_column, ax=ax)
         
-        # Save chart
-        chart_filename = f"{uuid.uuid4()}.png"
-        filepath = os.path.join(STATIC_DIR, chart_filename)
-        plt.savefig(filepath)
-        plt.close()
+    elif chart_type == 'violin':
+        sns.violinplot(data=plot_data, x=x_column, y=y_column, ax=ax)
         
-        chart_path = f"![Chart](/static/charts/{chart_filename})"
+    elif chart_type == 'pie':
+        if aggregation == 'count' or not y_column:
+            data = plot_data[x_column].value_counts() if x_column in plot_data.columns else plot_data['count']
+            ax.pie(data, labels=data.index, autopct='%1.1f%%')
+        else:
+            ax.pie(plot_data[y_column], labels=plot_data[x_column], autopct='%1.1f%%')
+            
+    elif chart_type == 'heatmap':
+        if not x_column and not y_column:
+            sns.heatmap(plot_data.select_dtypes(include=['number']).corr(), annot=True, cmap='coolwarm', ax=ax)
+        else:
+            pivot_data = plot_data.pivot_table(values=y_column, index=x_column, columns=group_by, aggfunc=aggregation or 'mean')
+            sns.heatmap(pivot_data, annot=True, cmap='coolwarm', ax=ax)
+            
+    elif chart_type == 'area':
+        plot_data.plot.area(x=x_column, y=y_column, ax=ax)
+    
+    # Set title
+    filter_text = f" (filtered: {filter_column}={filter_value})" if filter_column and filter_value else ""
+    ax.set_title(f"{title}{filter_text}")
+
+def _render_visualization(
+    chart_type: str,
+    x_column: str = None,
+    y_column: str = None,
+    title: str = "Chart",
+    filename: str = None,
+    filter_column: str = None,
+    filter_value: str = None,
+    aggregation: str = None,
+    group_by: str = None
+):
+    """Uncoalesced body of create_visualization. Callers hold _render_lock."""
+    print(f"[TOOL CALLED] create_visualization: type={chart_type}, x={x_column}, y={y_column}, filter={filter_column}={filter_value}, agg={aggregation}, group={group_by}")
+    
+    global dataframes, active_file
+    refresh_shared_state()
+    target_file = filename or active_file
+    
+    if not target_file or not _has_dataset(target_file):
+        return "Error: No data loaded or file not found."
+
+    df = _get_dataframe(target_file)
+    
+    try:
+        image_format, dpi = _image_options()
+        fig = _reused_panel_figure()
+        _draw_chart(
+            fig.add_subplot(), df, chart_type, x_column, y_column, title,
+            filter_column, filter_value, aggregation, group_by
+        )
+        chart_path = _save_figure(fig, image_format, dpi)
         print(f"[TOOL RETURN] {chart_path}")
         return chart_path
         
@@ -386,9 +1163,53 @@ def create_visualization(
         traceback.print_exc()
         return error_msg
 
-def generate_dashboard(chart_specs: list):
+def create_visualization(
+    chart_type: str,
+    x_column: str = None,
+    y_column: str = None,
+    title: str = "Chart",
+    filename: str = None,
+    filter_column: str = None,
+    filter_value: str = None,
+    aggregation: str = None,
+    group_by: str = None
+):
+    """
+    Flexible chart generation tool that can handle filtering, grouping, and aggregations.
+    
+    Args:
+        chart_type: Type of chart - 'bar', 'line', 'scatter', 'hist', 'pie', 'box', 'violin', 'heatmap', 'area', 'count'
+        x_column: Column for X-axis
+        y_column: Column for Y-axis (optional for some charts)
+        title: Chart title
+        filename: Data file to use (defaults to active file)
+        filter_column: Column to filter on (optional)
+        filter_value: Value to filter for (optional)
+        aggregation: Aggregation function - 'count', 'sum', 'mean', 'median', 'min', 'max' (optional)
+        group_by: Column to group by before aggregation (optional)
+    
+    Examples:
+        - Count of students by sex: chart_type='bar', x_column='sex', aggregation='count'
+        - Students with mother='teacher' by sex: chart_type='bar', x_column='sex', filter_column='Mjob', filter_value='teacher', aggregation='count'
+        - Average age by school: chart_type='bar', x_column='school', y_column='age', aggregation='mean'
+    """
+    refresh_shared_state()
+    params = {
+        'chart_type': chart_type, 'x_column': x_column, 'y_column': y_column, 'title': title,
+        'filename': filename or active_file, 'filter_column': filter_column, 'filter_value': filter_value,
+        'aggregation': aggregation, 'group_by': group_by
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+    
+    def render():
+        with _render_lock:
+            return _render_visualization(**params)
+    return _coalesce("visualization", params.get('filename'), params, render)
+
+def build_dashboard(chart_specs: list):
     """
     Generate multiple charts at once for dashboard display.
+    Returns {"charts": [...]} as a dict; generate_dashboard is the JSON-returning tool wrapper.
     
     Args:
         chart_specs: List of chart specifications, each containing:
@@ -397,9 +1218,10 @@ def generate_dashboard(chart_specs: list):
             - y_column: Column for Y-axis (optional)
             - title: Chart title
             - aggregation: 'count', 'sum', 'mean', etc. (optional)
+            - approximate: use sampled aggregation on very large files (optional)
     
     Returns:
-        JSON string with array of chart configurations
+        Dict with array of chart configurations
     """
     print(f"[TOOL CALLED] generate_dashboard: {len(chart_specs)} charts requested")
     
@@ -426,20 +1248,175 @@ def generate_dashboard(chart_specs: list):
             params['filter_value'] = spec['filter_value']
         if 'group_by' in spec and spec['group_by']:
             params['group_by'] = spec['group_by']
+        if 'approximate' in spec and spec['approximate']:
+            params['approximate'] = spec['approximate']
         
-        # Call generate_chart_data with filtered params
-        result = generate_chart_data(**params)
-        try:
-            chart_config = json.loads(result)
-            if "error" not in chart_config:
-                charts.append(chart_config)
-        except Exception as e:
-            print(f"[ERROR] Failed to parse chart: {e}")
-            pass
+        # Call build_chart_config with filtered params
+        chart_config = build_chart_config(**params)
+        if "error" not in chart_config:
+            charts.append(chart_config)
+        else:
+            print(f"[ERROR] Failed to build chart: {chart_config['error']}")
+    
+    return {"charts": charts}
+
+def generate_dashboard(chart_specs: list):
+    """
+    Generate multiple charts at once for dashboard display.
+    See build_dashboard for the chart spec format.
+    
+    Returns:
+        JSON string with array of chart configurations
+    """
+    return serialization.dumps(build_dashboard(chart_specs))
+
+# Chart parameters a dashboard image panel accepts, as create_visualization takes them
+_PANEL_PARAMS = ('chart_type', 'x_column', 'y_column', 'title', 'filename', 'filter_column', 'filter_value', 'aggregation', 'group_by')
+
+def _render_dashboard_image(panels, layout, image_format, dpi):
+    """Uncoalesced body of create_dashboard_image. Callers hold _render_lock."""
+    frames = {}
+
+    def draw(ax, panel):
+        name = panel.get('filename')
+        if not name or not _has_dataset(name):
+            raise ValueError("No data loaded or file not found.")
+        if name not in frames:
+            frames[name] = _get_dataframe(name)
+        _draw_chart(ax, frames[name], **{k: v for k, v in panel.items() if k != 'filename'})
+
+    links, errors = [], []
+    if layout == 'grid':
+        columns = min(DASHBOARD_IMAGE_COLUMNS, len(panels))
+        rows = -(-len(panels) // columns)
+        fig = _new_figure((PANEL_SIZE[0] * columns, PANEL_SIZE[1] * rows))
+        axes = fig.subplots(rows, columns, squeeze=False).ravel()
+        for ax, panel in zip(axes, panels):
+            try:
+                draw(ax, panel)
+            except Exception as e:
+                errors.append(f"{panel.get('title', 'Chart')}: {e}")
+                ax.clear()
+                ax.set_axis_off()
+                ax.text(0.5, 0.5, f"{panel.get('title', 'Chart')}\n{e}", ha='center', va='center', wrap=True)
+        for ax in axes[len(panels):]:
+            ax.set_visible(False)
+        if len(errors) < len(panels):
+            links.append(_save_figure(fig, image_format, dpi))
+    else:
+        for panel in panels:
+            fig = _reused_panel_figure()
+            try:
+                draw(fig.add_subplot(), panel)
+                links.append(_save_figure(fig, image_format, dpi))
+            except Exception as e:
+                errors.append(f"{panel.get('title', 'Chart')}: {e}")
+
+    for error in errors:
+        print(f"[TOOL ERROR] Dashboard panel {error}")
+    if not links:
+        return f"Error generating dashboard image: {'; '.join(errors)}"
+    result = "\n\n".join(links)
+    if errors:
+        result += f"\n\nCharts that could not be drawn: {'; '.join(errors)}"
+    print(f"[TOOL RETURN] {len(links)} image(s) for {len(panels)} charts")
+    return result
+
+def create_dashboard_image(chart_specs: list, layout: str = "grid", image_format: str = None, dpi: int = None):
+    """
+    Render several charts as images in one pass. With layout='grid' every
+    chart is a panel of one figure, saved once; with 'separate' each chart
+    is its own image, drawn on the same reused figure.
+    
+    Args:
+        chart_specs: List of chart specifications with create_visualization's parameters
+            (chart_type, x_column, y_column, title, filename, filter_column, filter_value, aggregation, group_by)
+        layout: 'grid' (one image) or 'separate' (one image per chart)
+        image_format: 'png', 'jpg' or 'svg' (defaults to CHART_IMAGE_FORMAT)
+        dpi: Resolution of png and jpg images (defaults to CHART_IMAGE_DPI)
     
-    return json.dumps({"charts": charts})
+    Returns:
+        Markdown image links separated by blank lines
+    """
+    print(f"[TOOL CALLED] create_dashboard_image: {len(chart_specs)} charts, layout={layout}, format={image_format}, dpi={dpi}")
+    refresh_shared_state()
+    try:
+        image_format, dpi = _image_options(image_format, dpi)
+    except ValueError as e:
+        return f"Error: {e}"
+    if layout not in ('grid', 'separate'):
+        return "Error: layout must be 'grid' or 'separate'"
+
+    panels = []
+    for spec in chart_specs:
+        panel = {k: spec[k] for k in _PANEL_PARAMS if spec.get(k)}
+        panel.setdefault('chart_type', 'bar')
+        panel['filename'] = panel.get('filename') or active_file
+        panels.append(panel)
+    if not panels:
+        return "Error: No charts requested."
+    params = {'panels': panels, 'layout': layout, 'image_format': image_format, 'dpi': dpi}
+
+    def render():
+        with _render_lock:
+            return _render_dashboard_image(**params)
+    files = {panel['filename'] for panel in panels}
+    if len(files) == 1:
+        return _coalesce("dashboard_image", files.pop(), params, render)
+    # Panels from several files have no single dataset version to cache the images under
+    return render()
+
+def _compact_number(value):
+    return round(value, 4) if isinstance(value, float) else value
+
+def _chart_summary(chart_config):
+    data = chart_config.get("data") or []
+    x_key = chart_config.get("x_key")
+    y_key = chart_config.get("y_key")
+    summary = {
+        "chart_type": chart_config.get("chart_type"),
+        "title": chart_config.get("title"),
+        "x_key": x_key,
+        "y_key": y_key,
+        "points": len(data)
+    }
+    if chart_config.get("approximation"):
+        summary["approximate"] = True
+
+    numeric_rows = [
+        row for row in data
+        if isinstance(row.get(y_key), (int, float)) and not isinstance(row.get(y_key), bool) and row[y_key] == row[y_key]
+    ]
+    if numeric_rows:
+        values = [row[y_key] for row in numeric_rows]
+        summary["y_min"] = _compact_number(min(values))
+        summary["y_max"] = _compact_number(max(values))
+        if summary["chart_type"] in ('bar', 'pie'):
+            top_rows = sorted(numeric_rows, key=lambda row: row[y_key], reverse=True)[:TOOL_SUMMARY_TOP_CATEGORIES]
+            summary["top"] = [[row.get(x_key), _compact_number(row[y_key])] for row in top_rows]
+    return summary
+
+def summarize_tool_result(function_name, result):
+    """
+    Compact text for the tool message sent back to the model: shape and key
+    statistics only. Chart data itself is rendered by the frontend and never
+    needs to go through the LLM.
+    """
+    if isinstance(result, dict):
+        if "error" in result:
+            return serialization.dumps(result)
+        if "charts" in result:
+            return serialization.dumps({"charts": [_chart_summary(c) for c in result["charts"]]})
+        return serialization.dumps(_chart_summary(result))
+    text = str(result)
+    # Retrieved passages are the evidence for the answer and already bounded (5 chunks of at most CHUNK_MAX_CHARS)
+    if function_name == "query_knowledge_base":
+        return text
+    if len(text) > TOOL_RESULT_MAX_CHARS:
+        text = text[:TOOL_RESULT_MAX_CHARS] + f"\n... [truncated {len(text) - TOOL_RESULT_MAX_CHARS} characters]"
+    return text
 
 # Tool definitions for Gemini
 # Tool definitions for Gemini
-tools_list = [generate_dashboard, generate_chart_data, create_visualization, get_data_summary, query_knowledge_base]
+tools_list = [generate_dashboard, generate_chart_data, create_visualization, create_dashboard_image, get_data_summary, query_knowledge_base]
 
@@ -0,0 +1,75 @@
+import os
+import json
+import time
+from collections import Counter
+
+import serialization
+
+# Warm the chart caches from chat history when the server starts
+CACHE_WARMUP = os.getenv("CACHE_WARMUP", "1") == "1"
+# Most recent assistant messages mined for charts
+WARMUP_HISTORY_MESSAGES = int(os.getenv("WARMUP_HISTORY_MESSAGES", "2000"))
+# Budget: most popular charts built, wall time, and size of the cached results
+WARMUP_MAX_CHARTS = int(os.getenv("WARMUP_MAX_CHARTS", "50"))
+WARMUP_SECONDS = float(os.getenv("WARMUP_SECONDS", "30"))
+WARMUP_MAX_MB = float(os.getenv("WARMUP_MAX_MB", "64"))
+
+
+def _legacy_spec(chart):
+    # Charts stored before specs were recorded: only unfiltered value counts can be rebuilt exactly
+    title = chart.get("title") or "Chart"
+    if chart.get("y_key") == "count" and chart.get("x_key") and "approximation" not in chart and "(filtered:" not in title:
+        return {"chart_type": chart.get("chart_type", "bar"), "x_column": chart["x_key"], "aggregation": "count", "title": title}
+    return None
+
+
+def chart_specs(contents):
+    """Counter of chart specs (sorted-key JSON) found in stored analytics responses."""
+    counts = Counter()
+    for content in contents:
+        if not content or not content.lstrip().startswith('{'):
+            continue
+        try:
+            message = serialization.loads(content)
+        except ValueError:
+            continue
+        if not isinstance(message, dict) or message.get("type") != "analytics_response":
+            continue
+        for chart in message.get("charts") or []:
+            spec = chart.get("spec") or _legacy_spec(chart)
+            if spec:
+                counts[json.dumps(spec, sort_keys=True)] += 1
+    return counts
+
+
+def warm(spec_counts, build_chart, is_loaded, max_charts=WARMUP_MAX_CHARTS, seconds=WARMUP_SECONDS,
+         max_bytes=WARMUP_MAX_MB * 1024 * 1024):
+    """
+    Build the most frequent specs first until a budget runs out. Specs on
+    datasets that are not loaded are skipped, so warm-up never parses files.
+    The memory budget counts the serialized size of the cached results; a
+    chart already being built when the time runs out still finishes.
+    """
+    started = time.monotonic()
+    stats = {"candidates": len(spec_counts), "built": 0, "skipped": 0, "failed": 0, "bytes": 0, "stopped_by": None}
+    for spec_json, _ in spec_counts.most_common(max_charts):
+        if time.monotonic() - started >= seconds:
+            stats["stopped_by"] = "time"
+            break
+        if stats["bytes"] >= max_bytes:
+            stats["stopped_by"] = "memory"
+            break
+        spec = json.loads(spec_json)
+        if not is_loaded(spec.get("filename")):
+            stats["skipped"] += 1
+            continue
+        result = build_chart(**spec)
+        if "error" in result:
+            stats["failed"] += 1
+            continue
+        stats["built"] += 1
+        stats["bytes"] += len(serialization.dumps(result))
+    stats["seconds"] = round(time.monotonic() - started, 3)
+    print(f"[WARMUP] Built {stats['built']} of {stats['candidates']} charts seen in history in {stats['seconds']}s"
+          f" ({stats['bytes'] / 1024:.0f} KB{', stopped by ' + stats['stopped_by'] + ' budget' if stats['stopped_by'] else ''})")
+    return stats
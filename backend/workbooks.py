@@ -0,0 +1,88 @@
+import os
+import pandas as pd
+
+# Rows turned into a typed frame at a time while streaming a sheet
+SHEET_CHUNK_ROWS = int(os.getenv("SHEET_CHUNK_ROWS", "50000"))
+# Dataset name of sheets after the first: "<file>:<sheet>"
+SHEET_SEPARATOR = ":"
+
+
+def is_streamable(path):
+    return path.endswith('.xlsx')
+
+
+def sheet_dataset_names(filename, sheets):
+    """Dataset name per sheet: the first keeps the plain filename, as single-sheet loads always did."""
+    return [filename if i == 0 else f"{filename}{SHEET_SEPARATOR}{sheet}" for i, sheet in enumerate(sheets)]
+
+
+def list_sheets(path):
+    """[(sheet name, row count or None)] from the workbook's metadata, without parsing any cell."""
+    if not is_streamable(path):
+        with pd.ExcelFile(path) as workbook:
+            return [(sheet, None) for sheet in workbook.sheet_names]
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # max_row comes from the sheet's <dimension> tag; writers that omit it leave it unknown
+        return [(sheet.title, sheet.max_row) for sheet in workbook.worksheets]
+    finally:
+        workbook.close()
+
+
+def _header(row):
+    names, seen = [], {}
+    for i, value in enumerate(row):
+        name = str(value).strip() if value is not None and str(value).strip() else f"column_{i + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _compact(df):
+    # Text columns as Arrow-backed strings, like the shared dataset store serves them
+    for column in df.columns:
+        if df[column].dtype == object and df[column].map(lambda v: v is None or isinstance(v, str)).all():
+            df[column] = df[column].astype(pd.StringDtype("pyarrow"))
+    return df
+
+
+def read_sheet(path, sheet, chunk_rows=SHEET_CHUNK_ROWS):
+    """
+    One sheet as a typed DataFrame. .xlsx sheets are streamed row by row in
+    read-only mode, so only this sheet is parsed and at most `chunk_rows` raw
+    rows are held as Python objects at once; the first non-empty row is the header.
+    """
+    if not is_streamable(path):
+        return _compact(pd.read_excel(path, sheet_name=sheet))
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        columns = None
+        for row in rows:
+            if any(value is not None for value in row):
+                columns = _header(row)
+                break
+        if columns is None:
+            return pd.DataFrame()
+
+        chunks, buffer = [], []
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            # Rows may be ragged when trailing cells are empty
+            buffer.append(tuple(row[:len(columns)]) + (None,) * (len(columns) - len(row)))
+            if len(buffer) >= chunk_rows:
+                chunks.append(pd.DataFrame.from_records(buffer, columns=columns).infer_objects())
+                buffer = []
+        if buffer or not chunks:
+            chunks.append(pd.DataFrame.from_records(buffer, columns=columns).infer_objects())
+    finally:
+        workbook.close()
+    df = chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+    return _compact(df)
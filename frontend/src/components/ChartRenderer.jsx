@@ -3,7 +3,18 @@ import { BarChart, Bar, LineChart, Line, PieChart, Pie, ScatterChart, Scatter, A
 
 const COLORS = ['#3b82f6', '#8b5cf6', '#06b6d4', '#10b981', '#f59e0b', '#ef4444', '#ec4899', '#6366f1'];
 
-const ChartRenderer = ({ chartConfig }) => {
+// Columnar payloads ({column: [values]}) are expanded back into row objects for Recharts
+const toRecords = (chartConfig) => {
+    if (chartConfig.data_format !== 'columnar') return chartConfig.data;
+    const columns = Object.keys(chartConfig.data);
+    const length = columns.length ? chartConfig.data[columns[0]].length : 0;
+    return Array.from({ length }, (_, i) =>
+        Object.fromEntries(columns.map((column) => [column, chartConfig.data[column][i]]))
+    );
+};
+
+const ChartRenderer = ({ chartConfig: rawConfig }) => {
+    const chartConfig = rawConfig && rawConfig.data ? { ...rawConfig, data: toRecords(rawConfig) } : rawConfig;
     if (!chartConfig || !chartConfig.data || chartConfig.data.length === 0) {
         return (
             <div className="p-8 text-center text-gray-400 bg-white/5 rounded-xl border border-white/10">
@@ -139,11 +139,15 @@ const AdminDashboard = () => {
     );
 };
 
+const PAGE_SIZE = 10;
+
 const DataPreview = () => {
     const { t } = useLanguage();
     const [data, setData] = useState(null);
     const [files, setFiles] = useState([]);
     const [selectedFile, setSelectedFile] = useState(null);
+    const [offset, setOffset] = useState(0);
+    const [sort, setSort] = useState({ column: null, descending: false });
 
     const fetchFiles = async () => {
         try {
@@ -167,7 +171,13 @@ const DataPreview = () => {
         const fetchData = async () => {
             if (!selectedFile) return;
             try {
-                const dataRes = await axios.get(`http://localhost:8000/data/preview?filename=${selectedFile}`);
+                // Pages are sorted and sliced on the server
+                const params = { filename: selectedFile, offset, limit: PAGE_SIZE };
+                if (sort.column) {
+                    params.sort_by = sort.column;
+                    params.descending = sort.descending;
+                }
+                const dataRes = await axios.get('http://localhost:8000/data/preview', { params });
                 if (dataRes.data.columns) {
                     setData(dataRes.data);
                 }
@@ -176,7 +186,18 @@ const DataPreview = () => {
             }
         };
         fetchData();
-    }, [selectedFile]);
+    }, [selectedFile, offset, sort]);
+
+    const selectFile = (f) => {
+        setSelectedFile(f);
+        setOffset(0);
+        setSort({ column: null, descending: false });
+    };
+
+    const toggleSort = (column) => {
+        setOffset(0);
+        setSort(prev => ({ column, descending: prev.column === column ? !prev.descending : false }));
+    };
 
     return (
         <motion.div
@@ -194,7 +215,7 @@ const DataPreview = () => {
                         {files.length > 0 ? files.map((f, i) => (
                             <div
                                 key={i}
-                                onClick={() => setSelectedFile(f)}
+                                onClick={() => selectFile(f)}
                                 className={`p-3 rounded-lg text-sm truncate cursor-pointer transition-colors ${selectedFile === f
                                     ? 'bg-blue-600 text-white'
                                     : 'bg-white/5 text-gray-300 hover:bg-white/10'
@@ -216,7 +237,9 @@ const DataPreview = () => {
                                 <thead className="text-xs text-gray-400 uppercase bg-white/5">
                                     <tr>
                                         {data.columns.map((col) => (
-                                            <th key={col} className="px-6 py-3">{col}</th>
+                                            <th key={col} onClick={() => toggleSort(col)} className="px-6 py-3 cursor-pointer select-none hover:text-white">
+                                                {col}{sort.column === col ? (sort.descending ? ' ▼' : ' ▲') : ''}
+                                            </th>
                                         ))}
                                     </tr>
                                 </thead>
@@ -230,7 +253,30 @@ const DataPreview = () => {
                                     ))}
                                 </tbody>
                             </table>
-                            <p className="mt-4 text-xs text-gray-500">{t('showing_rows').replace('{total}', data.total_rows)}</p>
+                            <div className="mt-4 flex items-center justify-between text-xs text-gray-500">
+                                <p>
+                                    {t('showing_rows')
+                                        .replace('{from}', data.matched_rows ? data.offset + 1 : 0)
+                                        .replace('{to}', data.offset + data.data.length)
+                                        .replace('{total}', data.matched_rows)}
+                                </p>
+                                <div className="flex gap-2">
+                                    <button
+                                        onClick={() => setOffset(Math.max(0, offset - PAGE_SIZE))}
+                                        disabled={offset === 0}
+                                        className="px-3 py-1 rounded bg-white/5 hover:bg-white/10 disabled:opacity-40"
+                                    >
+                                        {t('previous_page')}
+                                    </button>
+                                    <button
+                                        onClick={() => setOffset(offset + PAGE_SIZE)}
+                                        disabled={!data.next_cursor}
+                                        className="px-3 py-1 rounded bg-white/5 hover:bg-white/10 disabled:opacity-40"
+                                    >
+                                        {t('next_page')}
+                                    </button>
+                                </div>
+                            </div>
                         </div>
                     ) : (
                         <div className="flex flex-col items-center justify-center h-40 text-gray-500">
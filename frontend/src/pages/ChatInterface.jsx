@@ -81,7 +81,8 @@ const ChatInterface = ({ role }) => {
         try {
             const res = await axios.post('http://localhost:8000/chat', {
                 message: userMessage.content,
-                role: role
+                role: role,
+                data_format: 'columnar'
             });
 
             // Handle both text and analytics responses
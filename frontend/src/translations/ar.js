@@ -26,7 +26,9 @@ export const ar = {
     preview: "معاينة",
     no_files: "لا توجد ملفات مرفوعة",
     select_file: "اختر ملفاً لمعاينة البيانات.",
-    showing_rows: "عرض أول 10 صفوف من إجمالي {total} صف",
+    showing_rows: "عرض الصفوف {from}-{to} من إجمالي {total}",
+    previous_page: "السابق",
+    next_page: "التالي",
 
     // Common
     success: "نجاح",
@@ -26,7 +26,9 @@ export const en = {
     preview: "Preview",
     no_files: "No files uploaded",
     select_file: "Select a file to preview data.",
-    showing_rows: "Showing first 10 rows of {total} total rows",
+    showing_rows: "Showing rows {from}-{to} of {total}",
+    previous_page: "Previous",
+    next_page: "Next",
 
     // Common
     success: "Success",